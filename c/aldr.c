@@ -12,6 +12,8 @@
 #include "aldr.h"
 #include "flip.h"
 
+int aldr_lut_cache_bytes = 32768;
+
 void free_aldr_flat_s (struct aldr_flat_s x) {
     free(x.breadths);
     free(x.leaves_flat);
@@ -21,14 +23,31 @@ void free_array_s (struct array_s x) {
     free(x.a);
 }
 
+void free_aldr_lut_s (struct aldr_lut_s x) {
+    free(x.table);
+    free_aldr_flat_s(x.flat);
+}
+
+int aldr_min_depth(int* a, int n) {
+    // k = ceil(log2(m)), the depth of FLDR
+    int m = 0;
+    for (int i = 0; i < n; ++i) {
+        m += a[i];
+    }
+    return 32 - __builtin_clz(m) - (1 == __builtin_popcount(m));
+}
+
 struct aldr_flat_s preprocess_aldr_flat_k(int* a, int n, int kmul) {
     // assume k <= 31
+    return preprocess_aldr_flat_depth(a, n, aldr_min_depth(a, n) * kmul);
+}
+
+struct aldr_flat_s preprocess_aldr_flat_depth(int* a, int n, int K) {
+    // assume k <= K <= 62
     int m = 0;
     for (int i = 0; i < n; ++i) {
         m += a[i];
     }
-    int k = 32 - __builtin_clz(m) - (1 == __builtin_popcount(m));
-    int K = k * kmul;                       // depth
     long long c = (1ll << K) / m;           // amplification factor
     long long r = (1ll << K) % m;           // reject weight
 
@@ -74,14 +93,57 @@ struct aldr_flat_s preprocess_fldr_flat(int* a, int n) {
     return preprocess_aldr_flat_k(a, n, 1);
 }
 
+struct aldr_lut_s preprocess_aldr_lut(int* a, int n) {
+    struct aldr_flat_s f = preprocess_aldr_flat(a, n);
+    int K = f.length_breadths - 1;
+    // largest d <= min(K, 16) whose table fits in aldr_lut_cache_bytes
+    int d = 0;
+    while (d < K && d < 16 && (int)(sizeof(int) << (d + 1)) <= aldr_lut_cache_bytes) {
+        ++d;
+    }
+    int location_d = 0;
+    for (int j = 0; j < d; ++j) {
+        location_d += f.breadths[j];
+    }
+    // walk from the root along every string of d bits
+    int *table = malloc(sizeof(int) << d);
+    for (int bits = 0; bits < (1 << d); ++bits) {
+        int depth = 0;
+        int location = 0;
+        int val = 0;
+        for (;;) {
+            if (depth == d) {
+                table[bits] = val;
+                break;
+            }
+            if (val < f.breadths[depth]) {
+                table[bits] = ~((f.leaves_flat[location + val] << 5) | depth);
+                break;
+            }
+            location += f.breadths[depth];
+            val = ((val - f.breadths[depth]) << 1) | ((bits >> (d - 1 - depth)) & 1);
+            ++depth;
+        }
+    }
+    return (struct aldr_lut_s){
+            .d = d,
+            .location_d = location_d,
+            .table = table,
+            .flat = f
+        };
+}
+
 struct array_s preprocess_aldr_enc_k(int* a, int n, int kmul) {
     // assume k <= 31 like fldr does
+    return preprocess_aldr_enc_depth(a, n, aldr_min_depth(a, n) * kmul);
+}
+
+struct array_s preprocess_aldr_enc_depth(int* a, int n, int K) {
+    // assume k <= K <= 62
     int m = 0;
     for (int i = 0; i < n; ++i) {
         m += a[i];
     }
-    int k = 32 - __builtin_clz(m) - (1 == __builtin_popcount(m));
-    int K = k * kmul;
     long long c = (1ll << K) / m;
     long long r = (1ll << K) % m;
 
@@ -101,9 +163,6 @@ struct array_s preprocess_aldr_enc_k(int* a, int n, int kmul) {
             // reject outcome: flip and go to child of root
             enc[location++] = 1;
         }
-        if (r & bit) {
-            enc[location++] = ~0;
-        }
         for (int i = 0; i < n; ++i) {
             if ((c*a[i]) & bit) {
                 enc[location++] = ~(i+1);
@@ -127,6 +186,117 @@ struct array_s preprocess_fldr_enc(int* a, int n) {
     return preprocess_aldr_enc_k(a, n, 1);
 }
 
+// Preprocessing of uint64_t weights with sum m <= 2^63, using 128-bit
+// arithmetic for 2^K, c*a[i] and r at depths K <= 126. The output layouts
+// are those of the int versions, so the same samplers apply.
+
+static inline int popcount_u128(unsigned __int128 x) {
+    return __builtin_popcountll((uint64_t)x) + __builtin_popcountll((uint64_t)(x >> 64));
+}
+
+static inline unsigned __int128 sum_u64(uint64_t* a, int n) {
+    unsigned __int128 m = 0;
+    for (int i = 0; i < n; ++i) {
+        m += a[i];
+    }
+    return m;
+}
+
+int aldr_min_depth_u64(uint64_t* a, int n) {
+    // k = ceil(log2(m)), assume m <= 2^63
+    uint64_t m = sum_u64(a, n);
+    return m == 1 ? 0 : 64 - __builtin_clzll(m - 1);
+}
+
+struct aldr_flat_s preprocess_aldr_flat_k_u64(uint64_t* a, int n, int kmul) {
+    return preprocess_aldr_flat_depth_u64(a, n, aldr_min_depth_u64(a, n) * kmul);
+}
+
+struct aldr_flat_s preprocess_aldr_flat_depth_u64(uint64_t* a, int n, int K) {
+    // assume k <= K <= 126
+    unsigned __int128 m = sum_u64(a, n);
+    unsigned __int128 c = ((unsigned __int128)1 << K) / m;
+    unsigned __int128 r = ((unsigned __int128)1 << K) % m;
+
+    int num_leaves = popcount_u128(r);
+    for (int i = 0; i < n; ++i) {
+        num_leaves += popcount_u128(c * a[i]);
+    }
+
+    int *breadths = calloc(K + 1, sizeof(int));
+    int *leaves_flat = calloc(num_leaves, sizeof(int));
+
+    int location = 0;
+    for(int j = 0; j <= K; j++) {
+        unsigned __int128 bit = (unsigned __int128)1 << (K - j);
+        if (r & bit) {
+            leaves_flat[location] = 0;
+            ++breadths[j];
+            ++location;
+        }
+        for (int i = 0; i < n; ++i) {
+            if ((c * a[i]) & bit) {
+                leaves_flat[location] = i + 1;
+                ++breadths[j];
+                ++location;
+            }
+        }
+    }
+
+    return (struct aldr_flat_s){
+            .length_breadths = K+1,
+            .length_leaves_flat = num_leaves,
+            .breadths = breadths,
+            .leaves_flat = leaves_flat
+        };
+}
+
+struct aldr_flat_s preprocess_aldr_flat_u64(uint64_t* a, int n) {
+    return preprocess_aldr_flat_k_u64(a, n, 2);
+}
+
+struct array_s preprocess_aldr_enc_k_u64(uint64_t* a, int n, int kmul) {
+    return preprocess_aldr_enc_depth_u64(a, n, aldr_min_depth_u64(a, n) * kmul);
+}
+
+struct array_s preprocess_aldr_enc_depth_u64(uint64_t* a, int n, int K) {
+    // assume k <= K <= 126
+    unsigned __int128 m = sum_u64(a, n);
+    unsigned __int128 c = ((unsigned __int128)1 << K) / m;
+    unsigned __int128 r = ((unsigned __int128)1 << K) % m;
+
+    int num_leaves = popcount_u128(r);
+    for (int i = 0; i < n; ++i) {
+        num_leaves += popcount_u128(c * a[i]);
+    }
+    int *enc = calloc((num_leaves << 1) - 1, sizeof(int));
+    int prev_length = 1;
+    int location = 0;
+    for(int j = 0; j <= K; j++) {
+        unsigned __int128 bit = (unsigned __int128)1 << (K - j);
+        int next_length = prev_length;
+        if (r & bit) {
+            enc[location++] = 1;
+        }
+        for (int i = 0; i < n; ++i) {
+            if ((c * a[i]) & bit) {
+                enc[location++] = ~(i+1);
+            }
+        }
+        for ( ; location < prev_length; ++location) {
+            enc[location] = next_length;
+            next_length += 2;
+        }
+        prev_length = next_length;
+    }
+
+    return (struct array_s){ .length = (num_leaves << 1) - 1, .a = enc };
+}
+
+struct array_s preprocess_aldr_enc_u64(uint64_t* a, int n) {
+    return preprocess_aldr_enc_k_u64(a, n, 2);
+}
+
 int sample_aldr_flat(struct aldr_flat_s* f) {
     while (1) {
         int depth = 0;
@@ -157,6 +327,67 @@ int sample_aldr_enc(struct array_s* x) {
     }
 }
 
+void sample_aldr_flat_n(struct aldr_flat_s* f, int* out, int count) {
+    for (int i = 0; i < count; ++i) {
+        out[i] = sample_aldr_flat(f);
+    }
+}
+
+void sample_aldr_enc_n(struct array_s* x, int* out, int count) {
+    for (int i = 0; i < count; ++i) {
+        out[i] = sample_aldr_enc(x);
+    }
+}
+
+int sample_aldr_lut(struct aldr_lut_s* x) {
+    struct aldr_flat_s *f = &x->flat;
+    uint32_t mask = (1u << x->d) - 1;
+    while (1) {
+        // look up the next d bits; if fewer are buffered, the entry of the
+        // buffered bits (padded with zeros) is final when it is a leaf within
+        // them, and otherwise the lookup spans the refill of the word, with
+        // spanned bits of the previous word consumed
+        check_refill();
+        uint32_t spanned = 0;
+        uint32_t index;
+        if (flip_pos >= (uint32_t)x->d) {
+            index = (flip_word >> (flip_pos - x->d)) & mask;
+        } else {
+            uint32_t rest = x->d - flip_pos;
+            index = (flip_word & ((1u << flip_pos) - 1)) << rest;
+            int entry = x->table[index];
+            if (entry >= 0 || (uint32_t)(~entry & 31) > flip_pos) {
+                spanned = flip_pos;
+                flip_pos = 0;
+                check_refill();
+                // flip_word < 2^flip_k, so this is its top rest bits
+                index |= flip_word >> (flip_pos - rest);
+            }
+        }
+        int entry = x->table[index];
+        if (entry < 0) {
+            entry = ~entry;
+            flip_pos -= (entry & 31) - spanned;
+            if (entry >> 5) return (entry >> 5) - 1;
+            else continue;
+        }
+        flip_pos -= x->d - spanned;
+        int depth = x->d;
+        int location = x->location_d;
+        int val = entry;
+        for (;;) {
+            if (val < f->breadths[depth]) {
+                int ans = f->leaves_flat[location + val];
+                if (ans) return ans - 1;
+                else break;
+            }
+            location += f->breadths[depth];
+            val = ((val - f->breadths[depth]) << 1) | flip();
+            ++depth;
+        }
+    }
+}
+
 int bytes_sample_aldr_flat(struct aldr_flat_s *x) {
     // this doesn't count the length variables themselves
     // because we don't need them and just added them here
@@ -166,6 +397,16 @@ int bytes_sample_aldr_flat(struct aldr_flat_s *x) {
             + x->length_leaves_flat * sizeof(x->leaves_flat[0]);
 }
 
+void sample_aldr_lut_n(struct aldr_lut_s* x, int* out, int count) {
+    for (int i = 0; i < count; ++i) {
+        out[i] = sample_aldr_lut(x);
+    }
+}
+
+int bytes_sample_aldr_lut(struct aldr_lut_s *x) {
+    return bytes_sample_aldr_flat(&x->flat) + (sizeof(x->table[0]) << x->d);
+}
+
 int bytes_array(struct array_s *x) {
     return x->length * sizeof(x->a[0]) + sizeof(x->length);
 }
@@ -10,6 +10,8 @@
 #ifndef ALDR_H
 #define ALDR_H
 
+#include <stdint.h>
+
 // array
 struct array_s
 {
@@ -26,15 +28,48 @@ struct aldr_flat_s
     int *leaves_flat;
 };
 
+// flattened ALDR tree with a lookup table for its top d levels:
+// table[b] for the next d bits b is either ~((label << 5) | depth) for a
+// leaf at depth < d, or the index of the walk among the nodes at depth d
+struct aldr_lut_s
+{
+    int d;
+    int location_d;
+    int *table;
+    struct aldr_flat_s flat;
+};
+
+// size in bytes of the largest lookup table used by preprocess_aldr_lut
+extern int aldr_lut_cache_bytes;
+
 void free_aldr_flat_s (struct aldr_flat_s x);
 void free_array_s (struct array_s x);
+void free_aldr_lut_s (struct aldr_lut_s x);
+int aldr_min_depth(int* a, int n);
+struct aldr_flat_s preprocess_aldr_flat_depth(int* a, int n, int K);
+struct aldr_flat_s preprocess_aldr_flat_k(int* a, int n, int kmul);
 struct aldr_flat_s preprocess_aldr_flat(int* a, int n);
 struct aldr_flat_s preprocess_fldr_flat(int* a, int n);
+struct aldr_lut_s preprocess_aldr_lut(int* a, int n);
+struct array_s preprocess_aldr_enc_depth(int* a, int n, int K);
+struct array_s preprocess_aldr_enc_k(int* a, int n, int kmul);
 struct array_s preprocess_aldr_enc(int* a, int n);
 struct array_s preprocess_fldr_enc(int* a, int n);
+int aldr_min_depth_u64(uint64_t* a, int n);
+struct aldr_flat_s preprocess_aldr_flat_depth_u64(uint64_t* a, int n, int K);
+struct aldr_flat_s preprocess_aldr_flat_k_u64(uint64_t* a, int n, int kmul);
+struct aldr_flat_s preprocess_aldr_flat_u64(uint64_t* a, int n);
+struct array_s preprocess_aldr_enc_depth_u64(uint64_t* a, int n, int K);
+struct array_s preprocess_aldr_enc_k_u64(uint64_t* a, int n, int kmul);
+struct array_s preprocess_aldr_enc_u64(uint64_t* a, int n);
 int sample_aldr_flat(struct aldr_flat_s* f);
 int sample_aldr_enc(struct array_s* x);
+int sample_aldr_lut(struct aldr_lut_s* x);
+void sample_aldr_flat_n(struct aldr_flat_s* f, int* out, int count);
+void sample_aldr_enc_n(struct array_s* x, int* out, int count);
+void sample_aldr_lut_n(struct aldr_lut_s* x, int* out, int count);
 int bytes_sample_aldr_flat(struct aldr_flat_s *x);
 int bytes_array(struct array_s *x);
+int bytes_sample_aldr_lut(struct aldr_lut_s *x);
 
 #endif
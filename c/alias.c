@@ -154,6 +154,12 @@ uint32_t sample_weighted_alias_index(struct sample_weighted_alias_index_s *x) {
     }
 }
 
+void sample_weighted_alias_index_n(struct sample_weighted_alias_index_s *x, uint32_t *out, int count) {
+    for (int i = 0; i < count; ++i) {
+        out[i] = sample_weighted_alias_index(x);
+    }
+}
+
 int bytes_sample_weighted_alias_index(struct sample_weighted_alias_index_s *x) {
     return
         x->length * sizeof(x->aliases[0])
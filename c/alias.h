@@ -23,6 +23,7 @@ struct sample_weighted_alias_index_s {
 void free_sample_weighted_alias_index(struct sample_weighted_alias_index_s x);
 struct sample_weighted_alias_index_s preprocess_weighted_alias(int* a, int n);
 uint32_t sample_weighted_alias_index(struct sample_weighted_alias_index_s *x);
+void sample_weighted_alias_index_n(struct sample_weighted_alias_index_s *x, uint32_t *out, int count);
 int bytes_sample_weighted_alias_index(struct sample_weighted_alias_index_s *x);
 
 #endif
@@ -18,6 +18,7 @@ extern uint32_t flip_k;
 extern uint32_t flip_word;
 extern uint32_t flip_pos;
 
+void check_refill(void);
 uint32_t flip(void);
 uint32_t flip_n(uint32_t n);
 uint32_t uniform(uint32_t n);
@@ -20,10 +20,13 @@
         var_n, \
         var_sample_steps, \
         var_preprocess_steps, \
+        var_sample_warmup_steps, \
+        var_sample_dump_steps, \
         var_preprocess_time_cold, \
         var_preprocess_time_warm, \
         var_preprocess_bytes, \
         var_sample_time, \
+        var_sample_bits, \
         var_x) \
     if(strcmp(var_sampler, key) == 0) { \
         var_preprocess_time_cold = ns(); \
@@ -35,11 +38,19 @@
             s = func_preprocess(var_array, var_n); \
         } \
         var_preprocess_time_warm = ns() - var_preprocess_time_warm; \
+        for (int i = 0; i < var_sample_warmup_steps; i++) { \
+            var_x += func_sample(&s); \
+        } \
+        var_sample_bits = NUM_RNG_CALLS * flip_k - flip_pos; \
         var_sample_time = ns(); \
         for (int i = 0; i < var_sample_steps; i++) { \
             var_x += func_sample(&s); \
         } \
         var_sample_time = ns() - var_sample_time; \
+        var_sample_bits = NUM_RNG_CALLS * flip_k - flip_pos - var_sample_bits; \
+        for (int i = 0; i < var_sample_dump_steps; i++) { \
+            printf("%d\n", func_sample(&s)); \
+        } \
         var_preprocess_bytes = func_bytes(&s); \
         func_free(s); \
     }
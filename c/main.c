@@ -7,52 +7,168 @@
   Released under Apache 2.0; refer to LICENSE.txt
 */
 
+#include <dirent.h>
+#include <inttypes.h>
+#include <limits.h>
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
+#include <sys/stat.h>
 
 #include "flip.h"
 #include "macros.c"
 #include "aldr.h"
 #include "alias.h"
+#include "recycle.h"
 
-int main(int argc, char **argv) {
-    if (argc != 3) {
-        printf("usage: %s sampler path\n", argv[0]);
-        exit(0);
+// depth of the aldr.*.depth samplers, set from a sampler name
+// ending in ".kmul<kmul>" (K = kmul * k) or ".K<K>"
+int sweep_kmul = 0;
+int sweep_depth = 0;
+
+int sweep_check_depth(int k, int max_depth) {
+    int K = sweep_kmul ? sweep_kmul * k : sweep_depth;
+    if (K < k || K > max_depth) {
+        fprintf(stderr, "depth %d out of range [%d, %d]\n", K, k, max_depth);
+        exit(1);
+    }
+    return K;
+}
+
+int sweep_in_range(int k, int max_depth) {
+    int K = sweep_kmul ? sweep_kmul * k : sweep_depth;
+    if (K < k || K > max_depth) {
+        fprintf(stderr, "depth %d out of range [%d, %d]\n", K, k, max_depth);
+        return 0;
     }
-    char *sampler = argv[1];
-    char *path = argv[2];
+    return 1;
+}
+
+int sweep_get_depth(int* a, int n) {
+    return sweep_check_depth(aldr_min_depth(a, n), 62);
+}
+
+int sweep_get_depth_u64(uint64_t* a, int n) {
+    return sweep_check_depth(aldr_min_depth_u64(a, n), 126);
+}
+
+struct aldr_flat_s preprocess_aldr_flat_sweep(int* a, int n) {
+    return preprocess_aldr_flat_depth(a, n, sweep_get_depth(a, n));
+}
+
+struct array_s preprocess_aldr_enc_sweep(int* a, int n) {
+    return preprocess_aldr_enc_depth(a, n, sweep_get_depth(a, n));
+}
+
+struct aldr_flat_s preprocess_aldr_flat_u64_sweep(uint64_t* a, int n) {
+    return preprocess_aldr_flat_depth_u64(a, n, sweep_get_depth_u64(a, n));
+}
+
+struct array_s preprocess_aldr_enc_u64_sweep(uint64_t* a, int n) {
+    return preprocess_aldr_enc_depth_u64(a, n, sweep_get_depth_u64(a, n));
+}
+
+// number of timed samples, of warm preprocessing runs, of untimed
+// samples drawn before the timed ones, and of samples printed after them
+// (see usage)
+int num_samples = 100000000;
+int num_preprocess_warm = 1000;
+int num_samples_warmup = 0;
+int num_samples_dump = 0;
+
+// measurements of one sampler on one distribution
+struct bench_s {
+    int x;                          // checksum of the samples
+    double preprocess_time_cold;    // seconds
+    double preprocess_time_warm;    // seconds per preprocessing
+    double sample_time;             // seconds per sample
+    double sample_bits;             // random bits per sample
+    size_t preprocess_bytes;
+};
+
+// bit source of the samplers without ".osrng"
+uint32_t flip_k_rand;
+
+int bench(char *sampler_name, char *path, struct bench_s *result) {
+    // benchmark the sampler sampler_name on the distribution in path;
+    // returns 0, or 1 (with a message on stderr) on error
+    char sampler[64];
+    snprintf(sampler, sizeof(sampler), "%s", sampler_name);
+
+    // start from a fresh bit source, as in a new process (whose rand()
+    // starts as after srand(1))
+    srand(1);
+    flip_k = flip_k_rand;
+    NUM_RNG_CALLS = 0;
+    flip_pos = 0;
+    reset_recycle();
+    sweep_kmul = 0;
+    sweep_depth = 0;
 
     // check if sampler ends in ".osrng".
     // If so, set flip_k = 32 and remove ".osrng" from sampler.
-    if (strstr(sampler, ".osrng") != NULL) {
+    char *suffix;
+    if ((suffix = strstr(sampler, ".osrng")) != NULL) {
         flip_k = 32;
-        sampler[strlen(sampler)-6] = '\0';
+        *suffix = '\0';
+    }
+
+    // check if sampler ends in ".kmul<kmul>" or ".K<K>" (after ".osrng"
+    // is removed). If so, set the depth and use the sampler "<prefix>.depth".
+    if ((suffix = strstr(sampler, ".kmul")) != NULL) {
+        sweep_kmul = atoi(suffix + 5);
+    } else if ((suffix = strstr(sampler, ".K")) != NULL) {
+        sweep_depth = atoi(suffix + 2);
+    }
+    if (suffix != NULL) {
+        *suffix = '\0';
+        strncat(sampler, ".depth", sizeof(sampler) - strlen(sampler) - 1);
     }
+    int is_u64 = strstr(sampler, ".u64") != NULL;
 
-    // Load the distribution.
+    // Load the distribution. The weights are read as uint64_t and used as
+    // such by the ".u64" samplers (weight sum at most 2^63), and as int by
+    // the others (weight sum below 2^31).
     FILE *fp = fopen(path, "r");
-    int Z;
-    fscanf(fp, "%d", &Z);
+    if (fp == NULL) {
+        fprintf(stderr, "cannot open %s\n", path);
+        return 1;
+    }
+    uint64_t Z;
+    fscanf(fp, "%" SCNu64, &Z);
     int n;
     fscanf(fp, "%d", &n);
+    uint64_t* array_u64 = calloc(n, sizeof(uint64_t));
     int* array = calloc(n, sizeof(int));
+    unsigned __int128 weight_sum = 0;
     for (int i = 0; i < n; ++i) {
-        fscanf(fp, "%d", &array[i]);
+        fscanf(fp, "%" SCNu64, &array_u64[i]);
+        array[i] = (int)array_u64[i];
+        weight_sum += array_u64[i];
     }
     fclose(fp);
-
-    int num_samples = 100000000;
-    int num_preprocess_warm = 1000;
+    int valid = 1;
+    if (is_u64 ? weight_sum > ((unsigned __int128)1 << 63) : weight_sum > INT_MAX) {
+        fprintf(stderr, "weight sum too large for %s\n", sampler_name);
+        valid = 0;
+    } else if (sweep_kmul || sweep_depth) {
+        valid = is_u64
+            ? sweep_in_range(aldr_min_depth_u64(array_u64, n), 126)
+            : sweep_in_range(aldr_min_depth(array, n), 62);
+    }
+    if (!valid) {
+        free(array);
+        free(array_u64);
+        return 1;
+    }
 
     unsigned long long preprocess_time_cold = 0;
     unsigned long long preprocess_time_warm = 0;
     unsigned long long sample_time = 0;
+    uint64_t sample_bits = 0;
     size_t preprocess_bytes = 0;
 
     int x = 0;
-    unsigned long long t;
     READ_PREPROCESS_SAMPLE_TIME("aldr.flat",
         sampler,
         aldr_flat_s,
@@ -64,10 +180,13 @@ int main(int argc, char **argv) {
         n,
         num_samples,
         num_preprocess_warm,
+        num_samples_warmup,
+        num_samples_dump,
         preprocess_time_cold,
         preprocess_time_warm,
         preprocess_bytes,
         sample_time,
+        sample_bits,
         x)
     else READ_PREPROCESS_SAMPLE_TIME("fldr.flat",
         sampler,
@@ -80,10 +199,13 @@ int main(int argc, char **argv) {
         n,
         num_samples,
         num_preprocess_warm,
+        num_samples_warmup,
+        num_samples_dump,
         preprocess_time_cold,
         preprocess_time_warm,
         preprocess_bytes,
         sample_time,
+        sample_bits,
         x)
     else READ_PREPROCESS_SAMPLE_TIME("aldr.enc",
         sampler,
@@ -96,10 +218,13 @@ int main(int argc, char **argv) {
         n,
         num_samples,
         num_preprocess_warm,
+        num_samples_warmup,
+        num_samples_dump,
         preprocess_time_cold,
         preprocess_time_warm,
         preprocess_bytes,
         sample_time,
+        sample_bits,
         x)
     else READ_PREPROCESS_SAMPLE_TIME("fldr.enc",
         sampler,
@@ -112,10 +237,165 @@ int main(int argc, char **argv) {
         n,
         num_samples,
         num_preprocess_warm,
+        num_samples_warmup,
+        num_samples_dump,
+        preprocess_time_cold,
+        preprocess_time_warm,
+        preprocess_bytes,
+        sample_time,
+        sample_bits,
+        x)
+    else READ_PREPROCESS_SAMPLE_TIME("aldr.flat.depth",
+        sampler,
+        aldr_flat_s,
+        preprocess_aldr_flat_sweep,
+        bytes_sample_aldr_flat,
+        sample_aldr_flat,
+        free_aldr_flat_s,
+        array,
+        n,
+        num_samples,
+        num_preprocess_warm,
+        num_samples_warmup,
+        num_samples_dump,
+        preprocess_time_cold,
+        preprocess_time_warm,
+        preprocess_bytes,
+        sample_time,
+        sample_bits,
+        x)
+    else READ_PREPROCESS_SAMPLE_TIME("aldr.enc.depth",
+        sampler,
+        array_s,
+        preprocess_aldr_enc_sweep,
+        bytes_array,
+        sample_aldr_enc,
+        free_array_s,
+        array,
+        n,
+        num_samples,
+        num_preprocess_warm,
+        num_samples_warmup,
+        num_samples_dump,
+        preprocess_time_cold,
+        preprocess_time_warm,
+        preprocess_bytes,
+        sample_time,
+        sample_bits,
+        x)
+    else READ_PREPROCESS_SAMPLE_TIME("aldr.flat.u64",
+        sampler,
+        aldr_flat_s,
+        preprocess_aldr_flat_u64,
+        bytes_sample_aldr_flat,
+        sample_aldr_flat,
+        free_aldr_flat_s,
+        array_u64,
+        n,
+        num_samples,
+        num_preprocess_warm,
+        num_samples_warmup,
+        num_samples_dump,
+        preprocess_time_cold,
+        preprocess_time_warm,
+        preprocess_bytes,
+        sample_time,
+        sample_bits,
+        x)
+    else READ_PREPROCESS_SAMPLE_TIME("aldr.enc.u64",
+        sampler,
+        array_s,
+        preprocess_aldr_enc_u64,
+        bytes_array,
+        sample_aldr_enc,
+        free_array_s,
+        array_u64,
+        n,
+        num_samples,
+        num_preprocess_warm,
+        num_samples_warmup,
+        num_samples_dump,
+        preprocess_time_cold,
+        preprocess_time_warm,
+        preprocess_bytes,
+        sample_time,
+        sample_bits,
+        x)
+    else READ_PREPROCESS_SAMPLE_TIME("aldr.flat.u64.depth",
+        sampler,
+        aldr_flat_s,
+        preprocess_aldr_flat_u64_sweep,
+        bytes_sample_aldr_flat,
+        sample_aldr_flat,
+        free_aldr_flat_s,
+        array_u64,
+        n,
+        num_samples,
+        num_preprocess_warm,
+        num_samples_warmup,
+        num_samples_dump,
+        preprocess_time_cold,
+        preprocess_time_warm,
+        preprocess_bytes,
+        sample_time,
+        sample_bits,
+        x)
+    else READ_PREPROCESS_SAMPLE_TIME("aldr.enc.u64.depth",
+        sampler,
+        array_s,
+        preprocess_aldr_enc_u64_sweep,
+        bytes_array,
+        sample_aldr_enc,
+        free_array_s,
+        array_u64,
+        n,
+        num_samples,
+        num_preprocess_warm,
+        num_samples_warmup,
+        num_samples_dump,
+        preprocess_time_cold,
+        preprocess_time_warm,
+        preprocess_bytes,
+        sample_time,
+        sample_bits,
+        x)
+    else READ_PREPROCESS_SAMPLE_TIME("aldr.lut",
+        sampler,
+        aldr_lut_s,
+        preprocess_aldr_lut,
+        bytes_sample_aldr_lut,
+        sample_aldr_lut,
+        free_aldr_lut_s,
+        array,
+        n,
+        num_samples,
+        num_preprocess_warm,
+        num_samples_warmup,
+        num_samples_dump,
         preprocess_time_cold,
         preprocess_time_warm,
         preprocess_bytes,
         sample_time,
+        sample_bits,
+        x)
+    else READ_PREPROCESS_SAMPLE_TIME("recycle.c",
+        sampler,
+        recycle_s,
+        preprocess_recycle,
+        bytes_sample_recycle,
+        sample_recycle,
+        free_recycle_s,
+        array,
+        n,
+        num_samples,
+        num_preprocess_warm,
+        num_samples_warmup,
+        num_samples_dump,
+        preprocess_time_cold,
+        preprocess_time_warm,
+        preprocess_bytes,
+        sample_time,
+        sample_bits,
         x)
     else READ_PREPROCESS_SAMPLE_TIME("alias.c",
         sampler,
@@ -128,25 +408,173 @@ int main(int argc, char **argv) {
         n,
         num_samples,
         num_preprocess_warm,
+        num_samples_warmup,
+        num_samples_dump,
         preprocess_time_cold,
         preprocess_time_warm,
         preprocess_bytes,
         sample_time,
+        sample_bits,
         x)
+    else {
+        fprintf(stderr, "unknown sampler %s\n", sampler_name);
+        valid = 0;
+    }
     free(array);
+    free(array_u64);
+
+    result->x = x;
+    result->preprocess_time_cold = ((double)preprocess_time_cold) / 1e9;
+    result->preprocess_time_warm = ((double)preprocess_time_warm) / 1e9 / num_preprocess_warm;
+    result->sample_time = ((double)sample_time) / 1e9 / num_samples;
+    result->sample_bits = ((double)sample_bits) / num_samples;
+    result->preprocess_bytes = preprocess_bytes;
+    return !valid;
+}
+
+int compare_paths(const void *a, const void *b) {
+    return strcmp(*(char * const *)a, *(char * const *)b);
+}
+
+char **corpus_files(char **paths, int num_paths, int *num_files) {
+    // the paths given, with each directory replaced by the ".dist" files
+    // in it (in name order)
+    int capacity = 64;
+    char **files = malloc(capacity * sizeof(char *));
+    *num_files = 0;
+    for (int i = 0; i < num_paths; ++i) {
+        struct stat st;
+        DIR *dir;
+        if (stat(paths[i], &st) != 0 || !S_ISDIR(st.st_mode) || (dir = opendir(paths[i])) == NULL) {
+            if (*num_files == capacity) {
+                files = realloc(files, (capacity *= 2) * sizeof(char *));
+            }
+            files[(*num_files)++] = strdup(paths[i]);
+            continue;
+        }
+        int first = *num_files;
+        struct dirent *entry;
+        while ((entry = readdir(dir)) != NULL) {
+            size_t length = strlen(entry->d_name);
+            if (length < 5 || strcmp(entry->d_name + length - 5, ".dist") != 0) {
+                continue;
+            }
+            if (*num_files == capacity) {
+                files = realloc(files, (capacity *= 2) * sizeof(char *));
+            }
+            char *file = malloc(strlen(paths[i]) + length + 2);
+            sprintf(file, "%s/%s", paths[i], entry->d_name);
+            files[(*num_files)++] = file;
+        }
+        closedir(dir);
+        qsort(files + first, *num_files - first, sizeof(char *), compare_paths);
+    }
+    return files;
+}
+
+void bench_corpus(char *samplers, char **paths, int num_paths) {
+    // benchmark each of the comma-separated samplers on each file, one line
+    // "path sampler preprocess_time_cold preprocess_time_warm sample_time
+    // sample_bits preprocess_bytes" per run (as in
+    // python/aldr-alias-performance-data.txt); runs with errors are skipped
+    int num_files;
+    char **files = corpus_files(paths, num_paths, &num_files);
+    int checksum = 0;
+    char *saveptr;
+    for (char *sampler = strtok_r(samplers, ",", &saveptr);
+            sampler != NULL;
+            sampler = strtok_r(NULL, ",", &saveptr)) {
+        for (int i = 0; i < num_files; ++i) {
+            struct bench_s b;
+            if (bench(sampler, files[i], &b)) {
+                continue;
+            }
+            checksum += b.x;
+            printf("%s %s %1.9f %1.12f %1.15f %1.8f %zu\n",
+                    files[i],
+                    sampler,
+                    b.preprocess_time_cold,
+                    b.preprocess_time_warm,
+                    b.sample_time,
+                    b.sample_bits,
+                    b.preprocess_bytes);
+            fflush(stdout);
+        }
+    }
+    fprintf(stderr, "%dc\n", checksum);
+    for (int i = 0; i < num_files; ++i) {
+        free(files[i]);
+    }
+    free(files);
+}
 
-    double d_preprocess_time_cold = ((double)preprocess_time_cold) / 1e9;
-    double d_preprocess_time_warm = ((double)preprocess_time_warm) / 1e9 / num_preprocess_warm;
-    double d_sample_time = ((double)sample_time) / 1e9 / num_samples;
-    double d_sample_bits = ((double)(NUM_RNG_CALLS*flip_k-flip_pos)) / num_samples;
+void usage(char *name) {
+    printf("usage: %s [options] sampler path\n", name);
+    printf("       %s [options] --corpus sampler[,sampler...] path|directory...\n", name);
+    printf("options: --samples N (default 1e8), --preprocess N (default 1000),\n");
+    printf("         --warmup N (untimed samples before timing, default 0)\n");
+    printf("       %s --dump N sampler path\n", name);
+    printf("         (print N samples, one per line, instead of the measurements)\n");
+}
 
+int main(int argc, char **argv) {
+    flip_k_rand = flip_k;
+    int corpus = 0;
+    int i = 1;
+    for ( ; i < argc && strncmp(argv[i], "--", 2) == 0; ++i) {
+        if (strcmp(argv[i], "--corpus") == 0) {
+            corpus = 1;
+        } else if (i + 1 < argc && strcmp(argv[i], "--samples") == 0) {
+            num_samples = (int)strtod(argv[++i], NULL);
+        } else if (i + 1 < argc && strcmp(argv[i], "--preprocess") == 0) {
+            num_preprocess_warm = (int)strtod(argv[++i], NULL);
+        } else if (i + 1 < argc && strcmp(argv[i], "--warmup") == 0) {
+            num_samples_warmup = (int)strtod(argv[++i], NULL);
+        } else if (i + 1 < argc && strcmp(argv[i], "--dump") == 0) {
+            num_samples_dump = (int)strtod(argv[++i], NULL);
+        } else {
+            usage(argv[0]);
+            exit(1);
+        }
+    }
+
+    if (num_samples_dump) {
+        // only preprocess once and print the samples
+        if (corpus || argc - i != 2) {
+            usage(argv[0]);
+            exit(1);
+        }
+        num_samples = 0;
+        num_preprocess_warm = 0;
+        num_samples_warmup = 0;
+        struct bench_s b;
+        return bench(argv[i], argv[i+1], &b);
+    }
+
+    if (corpus) {
+        if (argc - i < 2) {
+            usage(argv[0]);
+            exit(1);
+        }
+        bench_corpus(argv[i], argv + i + 1, argc - i - 1);
+        return 0;
+    }
+
+    if (argc - i != 2) {
+        usage(argv[0]);
+        exit(0);
+    }
+    struct bench_s b;
+    if (bench(argv[i], argv[i+1], &b)) {
+        exit(1);
+    }
     printf("%dc %1.9f %1.12f %1.15f %1.8f %zu\n",
-            x,
-            d_preprocess_time_cold,
-            d_preprocess_time_warm,
-            d_sample_time,
-            d_sample_bits,
-            preprocess_bytes);
+            b.x,
+            b.preprocess_time_cold,
+            b.preprocess_time_warm,
+            b.sample_time,
+            b.sample_bits,
+            b.preprocess_bytes);
 
     return 0;
 }
@@ -0,0 +1,104 @@
+/*
+  Name:     recycle.c
+  Purpose:  Exact sampling with randomness recycling.
+  Author:   CMU Probabilistic Computing Systems Lab
+  Copyright (C) 2025 CMU Probabilistic Computing Systems Lab, All Rights Reserved.
+
+  Released under Apache 2.0; refer to LICENSE.txt
+*/
+
+// A sample from a with sum m is read off a uniform state (v, r), with v
+// uniform in [0, r), instead of a fresh walk from the root of a tree.
+// With q = r / m, if v < q * m then u = v % m lies in the interval
+// [cumulative[i], cumulative[i+1]) of exactly one outcome i, and, given i,
+// the pair (v / m, u - cumulative[i]) is uniform over [0, q) x [0, a[i])
+// and independent of all samples so far, so it becomes the state
+// (v / m * a[i] + u - cumulative[i], q * a[i]) of the next sample.
+// Otherwise v - q * m is uniform in [0, r - q * m) and the draw is repeated
+// on it. Bits are only consumed to extend the state back to 62 bits
+// whenever it falls below that, so none are discarded and the number of
+// bits per sample tends to the entropy H(a).
+
+#include <stdlib.h>
+#include <stdint.h>
+
+#include "flip.h"
+#include "recycle.h"
+
+#define RECYCLE_BITS 62
+
+uint64_t recycle_value = 0;
+uint64_t recycle_range = 1;
+
+void reset_recycle(void) {
+    recycle_value = 0;
+    recycle_range = 1;
+}
+
+void free_recycle_s(struct recycle_s x) {
+    free(x.cumulative);
+}
+
+struct recycle_s preprocess_recycle(int* a, int n) {
+    // assume the weights sum to less than 2^31
+    uint32_t *cumulative = malloc((n + 1) * sizeof(uint32_t));
+    cumulative[0] = 0;
+    for (int i = 0; i < n; ++i) {
+        cumulative[i+1] = cumulative[i] + a[i];
+    }
+    return (struct recycle_s) {.length = n, .cumulative = cumulative};
+}
+
+static inline void recycle_refill(void) {
+    // append random bits to the state until recycle_range >= 2^RECYCLE_BITS
+    if (recycle_range >> RECYCLE_BITS) {
+        return;
+    }
+    uint32_t num_bits = __builtin_clzll(recycle_range) - (63 - RECYCLE_BITS);
+    while (num_bits) {
+        uint32_t b = min(num_bits, 32u);
+        recycle_value = (recycle_value << b) | flip_n(b);
+        recycle_range <<= b;
+        num_bits -= b;
+    }
+}
+
+uint32_t sample_recycle(struct recycle_s *x) {
+    uint32_t *cumulative = x->cumulative;
+    uint64_t m = cumulative[x->length];
+    for (;;) {
+        recycle_refill();
+        uint64_t q = recycle_range / m;
+        if (recycle_value < q * m) {
+            uint64_t w = recycle_value / m;
+            uint32_t u = recycle_value - w * m;
+            // the last i with cumulative[i] <= u
+            uint32_t lo = 0;
+            uint32_t hi = x->length;
+            while (hi - lo > 1) {
+                uint32_t mid = (lo + hi) >> 1;
+                if (cumulative[mid] <= u) {
+                    lo = mid;
+                } else {
+                    hi = mid;
+                }
+            }
+            uint32_t a = cumulative[lo+1] - cumulative[lo];
+            recycle_value = w * a + (u - cumulative[lo]);
+            recycle_range = q * a;
+            return lo;
+        }
+        recycle_value -= q * m;
+        recycle_range -= q * m;
+    }
+}
+
+void sample_recycle_n(struct recycle_s *x, uint32_t *out, int count) {
+    for (int i = 0; i < count; ++i) {
+        out[i] = sample_recycle(x);
+    }
+}
+
+int bytes_sample_recycle(struct recycle_s *x) {
+    return (x->length + 1) * sizeof(x->cumulative[0]) + sizeof(x->length);
+}
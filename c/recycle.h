@@ -0,0 +1,33 @@
+/*
+  Name:     recycle.h
+  Purpose:  Exact sampling with randomness recycling.
+  Author:   CMU Probabilistic Computing Systems Lab
+  Copyright (C) 2025 CMU Probabilistic Computing Systems Lab, All Rights Reserved.
+
+  Released under Apache 2.0; refer to LICENSE.txt
+*/
+
+#ifndef RECYCLE_H
+#define RECYCLE_H
+
+#include <stdint.h>
+
+// cumulative weights: cumulative[i] = a[0] + ... + a[i-1], for i <= length
+struct recycle_s {
+    uint32_t length;
+    uint32_t *cumulative;
+};
+
+// uniform state shared by all recycling samplers:
+// recycle_value is uniform in [0, recycle_range)
+extern uint64_t recycle_value;
+extern uint64_t recycle_range;
+
+void reset_recycle(void);
+void free_recycle_s(struct recycle_s x);
+struct recycle_s preprocess_recycle(int* a, int n);
+uint32_t sample_recycle(struct recycle_s *x);
+void sample_recycle_n(struct recycle_s *x, uint32_t *out, int count);
+int bytes_sample_recycle(struct recycle_s *x);
+
+#endif
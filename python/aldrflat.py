@@ -0,0 +1,408 @@
+# Released under Apache 2.0; refer to LICENSE.txt
+
+# Flattened ALDR trees, as in c/aldr.c, and an interval-indexed variant.
+#
+# An ALDR tree of depth K amplifies the weights to c*a_i with c = 2^K // M
+# and a reject weight r = 2^K % M. Level j of the tree holds one leaf for
+# each of r, c*a_1, ..., c*a_n whose bit K-j is set, labeled 0 for reject
+# and i+1 for outcome i, in increasing order of label.
+#
+# preprocess_aldr_flat stores all levels in one array leaves_flat, with the
+# number of leaves per level in breadths, exactly as preprocess_aldr_flat_k
+# in c/aldr.c. It visits only the set bits of each c*a_i (a counting sort by
+# level), so it costs O(K + total number of leaves) instead of O(n K).
+#
+# preprocess_aldr_ranges stores each level as runs of consecutive labels
+# (a run is a start label and the offset of its first leaf in the level),
+# so a level whose leaves are labels l, l+1, ..., l+w-1 costs one run
+# instead of w leaves. The label at (depth, offset) is found by binary
+# search over the runs of that level. Distributions with many equal or
+# similar weights (and hence many equal bit patterns among neighbours)
+# have far fewer runs than leaves.
+
+import collections
+
+from array import array
+from bisect import bisect_right
+
+import numpy as np
+
+from alias import flip_integers
+from customtree import flip
+from customtree import flip_peek
+from customtree import flip_skip
+from customtree import nu
+
+AldrFlat = collections.namedtuple('AldrFlat', ['breadths', 'leaves_flat'])
+
+# flattened tree with a lookup table for its top d levels (see gen_aldr_lut)
+AldrLut = collections.namedtuple('AldrLut', ['d', 'location_d', 'table', 'flat'])
+
+# the runs of level j are run_offsets[level_runs[j]:level_runs[j+1]]
+# (offsets of the first leaf of each run in level j) and the matching
+# run_labels (label of the first leaf of each run)
+AldrRanges = collections.namedtuple('AldrRanges',
+    ['breadths', 'level_runs', 'run_offsets', 'run_labels'])
+
+def aldr_depth(arr, kmul = 2):
+    # the depth K = kmul * k of preprocess_aldr_flat_k in c/aldr.c
+    return kmul * (sum(arr)-1).bit_length()
+
+def amplified_weights(arr, K):
+    # the weights [r, c*a_1, ..., c*a_n] at the leaves of ALDR[arr, K]
+    M = sum(arr)
+    assert (M-1).bit_length() <= K
+    c, r = divmod(1 << K, M)
+    return [r] + [c * a for a in arr]
+
+def aldr_flat_breadths(weights, K):
+    # number of leaves at each level for the amplified weights [r, c*a_1, ...]
+    breadths = array('i', bytes(4 * (K + 1)))
+    for q in weights:
+        while q:
+            bit = q & -q
+            breadths[K + 1 - bit.bit_length()] += 1
+            q ^= bit
+    return breadths
+
+def fill_aldr_flat_leaves(weights, K, breadths, leaves_flat):
+    # write the labels of the leaves, level by level, into leaves_flat
+    # (any writable buffer of sum(breadths) integers)
+    location = array('i', bytes(4 * (K + 1)))
+    for j in range(K):
+        location[j+1] = location[j] + breadths[j]
+    for label, q in enumerate(weights):
+        while q:
+            bit = q & -q
+            j = K + 1 - bit.bit_length()
+            leaves_flat[location[j]] = label
+            location[j] += 1
+            q ^= bit
+
+def preprocess_aldr_flat(arr, K = None):
+    K = aldr_depth(arr) if K is None else K
+    weights = amplified_weights(arr, K)
+    breadths = aldr_flat_breadths(weights, K)
+    leaves_flat = array('i', bytes(4 * sum(breadths)))
+    fill_aldr_flat_leaves(weights, K, breadths, leaves_flat)
+    return AldrFlat(breadths, leaves_flat)
+
+def sample_aldr_flat(f):
+    # as sample_aldr_flat in c/aldr.c
+    breadths = f.breadths
+    leaves_flat = f.leaves_flat
+    while True:
+        depth = 0
+        location = 0
+        val = 0
+        while True:
+            if val < breadths[depth]:
+                ans = leaves_flat[location + val]
+                if ans:
+                    return ans - 1
+                break
+            location += breadths[depth]
+            val = ((val - breadths[depth]) << 1) | flip()
+            depth += 1
+
+def sample_aldr_flat_batch(f, size, rng = None, mask = None):
+    # size independent draws of sample_aldr_flat using NumPy (one step of
+    # every unfinished walk at a time), and the total number of bits consumed
+    # (drawn as in alias.sample_alias_batch); with a mask, as
+    # sample_aldr_flat_masked
+    if mask is not None:
+        check_mask(f, mask)
+        # accept[label] for labels 0 (reject), 1, ..., n
+        accept_label = np.concatenate(([False], np.asarray(mask, dtype=bool)))
+    breadths = np.frombuffer(f.breadths, dtype=np.int32).astype(np.int64)
+    leaves_flat = np.frombuffer(f.leaves_flat, dtype=np.int32)
+    starts = np.concatenate(([0], np.cumsum(breadths)[:-1]))
+    out = np.empty(size, dtype=np.int64)
+    active = np.arange(size)
+    depth = np.zeros(size, dtype=np.int64)
+    val = np.zeros(size, dtype=np.int64)
+    bits = 0
+    while active.size:
+        breadth = breadths[depth]
+        leaf = val < breadth
+        ans = leaves_flat[starts[depth[leaf]] + val[leaf]]
+        accept = np.zeros(active.size, dtype=bool)
+        accept[leaf] = ans > 0 if mask is None else accept_label[ans]
+        out[active[accept]] = ans[accept[leaf]] - 1
+        # rejected walks restart from the root
+        restart = leaf & ~accept
+        depth[restart] = 0
+        val[restart] = 0
+        walk = ~leaf
+        val[walk] = ((val[walk] - breadth[walk]) << 1) | flip_integers(1, int(walk.sum()), rng)
+        depth[walk] += 1
+        bits += int(walk.sum())
+        keep = ~accept
+        active = active[keep]
+        depth = depth[keep]
+        val = val[keep]
+    return out, bits
+
+# Conditional sampling: the distribution P restricted to a subset S of the
+# outcomes is sampled from the tree of P by treating the leaves of outcomes
+# outside S as reject leaves. Each pass through the tree still costs
+# nu(r, K) + sum_i nu(c a_i, K) bits, but accepts with probability
+# c M_S / 2^K (where M_S is the weight of S) instead of c M / 2^K, so the
+# expected cost grows by the factor M / M_S. masked_cost compares this cost
+# with that of a tree rebuilt for the weights in S.
+
+def mask_from_bitset(bits, n):
+    # boolean mask of the outcomes i < n whose bit i is set
+    return bytearray((bits >> i) & 1 for i in range(n))
+
+def check_mask(f, mask):
+    # raise ValueError unless mask keeps an outcome with positive weight
+    if not any(label and mask[label - 1] for label in f.leaves_flat):
+        raise ValueError('mask excludes every outcome with positive weight')
+
+def sample_aldr_flat_masked(f, mask):
+    # sample_aldr_flat conditioned on the outcomes i with mask[i] true; the
+    # mask is checked (with check_mask) when the first pass rejects, so that
+    # the rejection loop terminates
+    breadths = f.breadths
+    leaves_flat = f.leaves_flat
+    num_passes = 0
+    while True:
+        num_passes += 1
+        if num_passes == 2:
+            check_mask(f, mask)
+        depth = 0
+        location = 0
+        val = 0
+        while True:
+            if val < breadths[depth]:
+                ans = leaves_flat[location + val]
+                if ans and mask[ans - 1]:
+                    return ans - 1
+                break
+            location += breadths[depth]
+            val = ((val - breadths[depth]) << 1) | flip()
+            depth += 1
+
+def _pass_cost(arr, K):
+    # bits consumed by one pass through ALDR[arr, K], and its amplification c
+    return sum(nu(q, K) for q in amplified_weights(arr, K)), (1 << K) // sum(arr)
+
+def masked_cost(arr, mask, K = None):
+    # expected entropy consumption of sample_aldr_flat_masked on
+    # preprocess_aldr_flat(arr, K), and of sample_aldr_flat on the tree
+    # rebuilt for the outcomes in mask (at its default depth)
+    K = aldr_depth(arr) if K is None else K
+    arr_masked = [a for a, keep in zip(arr, mask) if keep and a]
+    assert arr_masked
+    M_masked = sum(arr_masked)
+    pass_cost, c = _pass_cost(arr, K)
+    K_masked = aldr_depth(arr_masked)
+    pass_cost_masked, c_masked = _pass_cost(arr_masked, K_masked)
+    return pass_cost * (1 << K) / (c * M_masked), \
+        pass_cost_masked * (1 << K_masked) / (c_masked * M_masked)
+
+def bytes_aldr_flat(f):
+    return f.breadths.itemsize * len(f.breadths) + f.leaves_flat.itemsize * len(f.leaves_flat)
+
+def get_aldr_flat_entropy(f):
+    # expected entropy consumption (in bits) of sample_aldr_flat
+    one_run_entropy = 0
+    reject_probability = 0
+    location = 0
+    for depth, breadth in enumerate(f.breadths):
+        one_run_entropy += depth * breadth / 2**depth
+        if breadth and f.leaves_flat[location] == 0:
+            reject_probability += 1 / 2**depth
+        location += breadth
+    return one_run_entropy / (1 - reject_probability)
+
+def preprocess_aldr_enc(arr, K = None):
+    # the pointer encoding of preprocess_aldr_enc_k in c/aldr.c: enc[0] is the
+    # root, an entry x >= 0 is an internal node with children enc[x] and
+    # enc[x+1], and an entry ~(i+1) is a leaf for outcome i; a reject leaf is
+    # the pointer 1 to the children of the root
+    K = aldr_depth(arr) if K is None else K
+    weights = amplified_weights(arr, K)
+    num_leaves = sum(bin(q).count('1') for q in weights)
+    enc = array('i', bytes(4 * (2 * num_leaves - 1)))
+    prev_length = 1
+    location = 0
+    for j in range(K + 1):
+        bit = 1 << (K - j)
+        next_length = prev_length
+        if weights[0] & bit:
+            enc[location] = 1
+            location += 1
+        for label in range(1, len(weights)):
+            if weights[label] & bit:
+                enc[location] = ~label
+                location += 1
+        while location < prev_length:
+            enc[location] = next_length
+            next_length += 2
+            location += 1
+        prev_length = next_length
+    return enc
+
+def sample_aldr_enc(enc):
+    # as sample_aldr_enc in c/aldr.c
+    x = enc[0]
+    while x >= 0:
+        x = enc[x + flip()]
+    return ~x - 1
+
+def sample_aldr_enc_batch(enc, size, rng = None):
+    # size independent draws of sample_aldr_enc using NumPy, and the total
+    # number of bits consumed (drawn as in alias.sample_alias_batch)
+    enc = np.frombuffer(enc, dtype=np.int32)
+    x = np.full(size, enc[0], dtype=np.int64)
+    bits = 0
+    while True:
+        walk = np.flatnonzero(x >= 0)
+        if not walk.size:
+            return ~x - 1, bits
+        x[walk] = enc[x[walk] + flip_integers(1, walk.size, rng)]
+        bits += walk.size
+
+# Lookup tables: the walk of sample_aldr_flat through the top d levels of
+# the tree is determined by the next d bits, so it can be replaced by one
+# lookup in a table of 2^d entries, as in preprocess_aldr_lut in c/aldr.c.
+# table[b] is ~((label << 5) | depth) if the walk along the bits b reaches a
+# leaf at depth < d (which consumes only depth bits), and otherwise the
+# index of the walk among the nodes at depth d, where the walk continues one
+# bit at a time. The samples and bits consumed are exactly as for
+# sample_aldr_flat. When fewer than d bits are buffered, the entry of the
+# buffered bits (padded with zeros) is used if it is a leaf within them;
+# otherwise the walk needs more bits than are buffered, so they are consumed
+# and the lookup is completed with the top bits of the next word. By
+# default, d is the largest depth whose table fits in LUT_CACHE_BYTES (a
+# typical L1 data cache).
+
+LUT_CACHE_BYTES = 32768
+LUT_MAX_BITS = 16
+
+def lut_bits(K, cache_bytes = LUT_CACHE_BYTES):
+    d = 0
+    while d < min(K, LUT_MAX_BITS) and 4 << (d + 1) <= cache_bytes:
+        d += 1
+    return d
+
+def gen_aldr_lut(f, d = None, cache_bytes = LUT_CACHE_BYTES):
+    breadths = f.breadths
+    leaves_flat = f.leaves_flat
+    K = len(breadths) - 1
+    d = lut_bits(K, cache_bytes) if d is None else d
+    assert 0 <= d <= K
+    table = array('i', bytes(4 << d))
+    for bits in range(1 << d):
+        depth = 0
+        location = 0
+        val = 0
+        while True:
+            if depth == d:
+                table[bits] = val
+                break
+            if val < breadths[depth]:
+                table[bits] = ~((leaves_flat[location + val] << 5) | depth)
+                break
+            location += breadths[depth]
+            val = ((val - breadths[depth]) << 1) | ((bits >> (d - 1 - depth)) & 1)
+            depth += 1
+    return AldrLut(d, sum(breadths[:d]), table, f)
+
+def preprocess_aldr_lut(arr, K = None, cache_bytes = LUT_CACHE_BYTES):
+    return gen_aldr_lut(preprocess_aldr_flat(arr, K), cache_bytes=cache_bytes)
+
+def sample_aldr_lut(lut):
+    d = lut.d
+    table = lut.table
+    breadths = lut.flat.breadths
+    leaves_flat = lut.flat.leaves_flat
+    while True:
+        bits, num_bits = flip_peek(d)
+        entry = table[bits]
+        spanned = 0
+        if num_bits < d and (entry >= 0 or (~entry & 31) > num_bits):
+            flip_skip(num_bits)
+            spanned = num_bits
+            bits |= flip_peek(d - num_bits)[0]
+            entry = table[bits]
+        if entry < 0:
+            entry = ~entry
+            flip_skip((entry & 31) - spanned)
+            if entry >> 5:
+                return (entry >> 5) - 1
+            continue
+        flip_skip(d - spanned)
+        depth = d
+        location = lut.location_d
+        val = entry
+        while True:
+            if val < breadths[depth]:
+                ans = leaves_flat[location + val]
+                if ans:
+                    return ans - 1
+                break
+            location += breadths[depth]
+            val = ((val - breadths[depth]) << 1) | flip()
+            depth += 1
+
+def bytes_aldr_lut(lut):
+    return bytes_aldr_flat(lut.flat) + lut.table.itemsize * len(lut.table)
+
+def preprocess_aldr_ranges(arr, K = None):
+    K = aldr_depth(arr) if K is None else K
+    breadths = array('i', bytes(4 * (K + 1)))
+    runs = [[] for _ in range(K + 1)]
+    last_label = [-2] * (K + 1)
+    for label, q in enumerate(amplified_weights(arr, K)):
+        while q:
+            bit = q & -q
+            j = K + 1 - bit.bit_length()
+            if last_label[j] != label - 1:
+                runs[j].append((breadths[j], label))
+            last_label[j] = label
+            breadths[j] += 1
+            q ^= bit
+    level_runs = array('q', [0])
+    run_offsets = array('q')
+    run_labels = array('q')
+    for level in runs:
+        for offset, label in level:
+            run_offsets.append(offset)
+            run_labels.append(label)
+        level_runs.append(len(run_offsets))
+    return AldrRanges(breadths, level_runs, run_offsets, run_labels)
+
+def aldr_ranges_lookup(f, depth, offset):
+    # the label of leaf number offset at the given depth
+    i = bisect_right(f.run_offsets, offset, f.level_runs[depth], f.level_runs[depth+1]) - 1
+    return f.run_labels[i] + offset - f.run_offsets[i]
+
+def sample_aldr_ranges(f):
+    breadths = f.breadths
+    while True:
+        depth = 0
+        val = 0
+        while True:
+            if val < breadths[depth]:
+                ans = aldr_ranges_lookup(f, depth, val)
+                if ans:
+                    return ans - 1
+                break
+            val = ((val - breadths[depth]) << 1) | flip()
+            depth += 1
+
+def bytes_aldr_ranges(f):
+    return sum(x.itemsize * len(x) for x in f)
+
+def get_aldr_ranges_entropy(f):
+    # expected entropy consumption (in bits) of sample_aldr_ranges
+    one_run_entropy = 0
+    reject_probability = 0
+    for depth, breadth in enumerate(f.breadths):
+        one_run_entropy += depth * breadth / 2**depth
+        if breadth and f.run_labels[f.level_runs[depth]] == 0:
+            reject_probability += 1 / 2**depth
+    return one_run_entropy / (1 - reject_probability)
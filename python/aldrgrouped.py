@@ -0,0 +1,65 @@
+# Released under Apache 2.0; refer to LICENSE.txt
+
+# Grouped ALDR trees for distributions with few distinct weights.
+#
+# The outcomes with the same weight w form a class whose total weight is
+# w times its multiplicity. A sample draws a class from the flattened ALDR
+# tree (aldrflat.py) over the class weights, and then a member of the class
+# uniformly with uniform (the exact uniform sampler of c/flip.c). The tree
+# has as many leaves as the set bits of the amplified class weights, so its
+# size scales with the number of distinct weights rather than with n; the
+# members of the classes are stored once, as an array of n outcomes ordered
+# by class. The class weights are divided by their gcd, and outcomes of
+# weight 0 are not stored.
+
+import collections
+import math
+
+from array import array
+
+from aldrflat import bytes_aldr_flat
+from aldrflat import get_aldr_flat_entropy
+from aldrflat import preprocess_aldr_flat
+from aldrflat import sample_aldr_flat
+from customtree import uniform
+from customtree import uniform_entropy
+
+# members[offsets[j]:offsets[j+1]] are the outcomes of weight weights[j]
+AldrGrouped = collections.namedtuple('AldrGrouped', ['flat', 'weights', 'offsets', 'members'])
+
+def preprocess_aldr_grouped(arr, K = None):
+    classes = {}
+    for i, a in enumerate(arr):
+        if a:
+            classes.setdefault(a, []).append(i)
+    weights = sorted(classes)
+    offsets = array('i', [0])
+    members = array('i')
+    for w in weights:
+        members.extend(classes[w])
+        offsets.append(len(members))
+    class_weights = [w * len(classes[w]) for w in weights]
+    g = math.gcd(*class_weights)
+    class_weights = [w // g for w in class_weights]
+    return AldrGrouped(preprocess_aldr_flat(class_weights, K), weights, offsets, members)
+
+def sample_aldr_grouped(g):
+    j = sample_aldr_flat(g.flat)
+    start = g.offsets[j]
+    size = g.offsets[j+1] - start
+    return g.members[start + uniform(size)] if size > 1 else g.members[start]
+
+def bytes_aldr_grouped(g):
+    return bytes_aldr_flat(g.flat) + g.offsets.itemsize * len(g.offsets) \
+        + g.members.itemsize * len(g.members)
+
+def get_aldr_grouped_entropy(g):
+    # expected entropy consumption (in bits) of sample_aldr_grouped: the class
+    # tree, then uniform over the members of the class drawn
+    M = sum(w * (g.offsets[j+1] - g.offsets[j]) for j, w in enumerate(g.weights))
+    cost = get_aldr_flat_entropy(g.flat)
+    for j, w in enumerate(g.weights):
+        size = g.offsets[j+1] - g.offsets[j]
+        if size > 1:
+            cost += w * size / M * uniform_entropy(size)
+    return cost
@@ -0,0 +1,142 @@
+# Released under Apache 2.0; refer to LICENSE.txt
+
+# Preprocess many distributions into flattened ALDR trees (see aldrflat.py)
+# across a process pool, storing all trees in one shared memory arena that
+# any process can attach to by name and sample from without copying.
+#
+# The arena is a multiprocessing.shared_memory block laid out as
+#   int64 count
+#   int64 index[count+1]     start of tree j in data (in int32 units)
+#   int32 levels[count]      number of levels K+1 of tree j
+#   int32 data[...]          breadths of tree j, then its leaves
+# so that tree j is data[index[j]:index[j+1]], whose first levels[j]
+# entries are the breadths and the rest are leaves_flat.
+#
+# Building takes two passes over the pool: the first computes the breadths
+# of every tree (which fixes the size and layout of the arena), and the
+# second writes the leaves of every tree directly into the arena.
+
+import sys
+
+from multiprocessing import Pool
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+
+from aldrflat import AldrFlat
+from aldrflat import aldr_depth
+from aldrflat import aldr_flat_breadths
+from aldrflat import amplified_weights
+from aldrflat import fill_aldr_flat_leaves
+from aldrflat import sample_aldr_flat
+
+def _attach(name, untrack):
+    # processes started by multiprocessing (after its resource tracker is
+    # running) share the resource tracker of the process that created the
+    # arena, where attaching again is harmless; an
+    # unrelated process must untrack the arena, or its own resource tracker
+    # would unlink the arena when the process exits
+    if untrack and sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    if untrack:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+def _header_bytes(count):
+    # bytes before data, rounded up to a multiple of 8
+    return (8 * (count + 2) + 4 * count + 7) & ~7
+
+class AldrArena:
+
+    def __init__(self, shm, owner = False):
+        self.shm = shm
+        self.owner = owner
+        buf = shm.buf
+        count = self.count = buf[:8].cast('q')[0]
+        self.index = buf[8:8*(count+2)].cast('q')
+        self.levels = buf[8*(count+2):8*(count+2)+4*count].cast('i')
+        self.data = buf[_header_bytes(count):].cast('i')
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @classmethod
+    def attach(cls, name, untrack = False):
+        return cls(_attach(name, untrack))
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, j):
+        # the flattened tree of distribution j, as views into the arena
+        start = self.index[j]
+        middle = start + self.levels[j]
+        return AldrFlat(self.data[start:middle], self.data[middle:self.index[j+1]])
+
+    def sample(self, j):
+        return sample_aldr_flat(self[j])
+
+    def bytes(self):
+        return _header_bytes(self.count) + 4 * self.index[self.count]
+
+    def close(self):
+        # trees returned by arena[j] are views into the mapping, and must be
+        # deleted before the arena is closed
+        for view in (self.index, self.levels, self.data):
+            view.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _breadths_task(task):
+    arr, K = task
+    K = aldr_depth(arr) if K is None else K
+    return K, aldr_flat_breadths(amplified_weights(arr, K), K)
+
+def _fill_task(task):
+    name, j, arr, K = task
+    arena = AldrArena.attach(name)
+    f = arena[j]
+    fill_aldr_flat_leaves(amplified_weights(arr, K), K, f.breadths, f.leaves_flat)
+    del f
+    arena.close()
+    return j
+
+def build_arena(arrays, K = None, processes = None, chunksize = 16):
+    # preprocess each weight array in arrays (at depth K, by default 2k) into
+    # a new arena; the caller owns the arena and unlinks it on close
+    arrays = list(arrays)
+    count = len(arrays)
+    depths = K if isinstance(K, (list, tuple)) else [K] * count
+    # start the resource tracker before the workers, so that they share it
+    resource_tracker.ensure_running()
+    with Pool(processes) as pool:
+        results = pool.map(_breadths_task, zip(arrays, depths), chunksize)
+        index = [0]
+        for K_j, breadths in results:
+            index.append(index[-1] + len(breadths) + sum(breadths))
+        size = _header_bytes(count) + 4 * max(index[-1], 1)
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        buf = shm.buf
+        buf[:8].cast('q')[0] = count
+        header_index = buf[8:8*(count+2)].cast('q')
+        header_levels = buf[8*(count+2):8*(count+2)+4*count].cast('i')
+        data = buf[_header_bytes(count):].cast('i')
+        for j, (K_j, breadths) in enumerate(results):
+            header_index[j] = index[j]
+            header_levels[j] = len(breadths)
+            data[index[j]:index[j]+len(breadths)] = breadths
+        header_index[count] = index[count]
+        for view in (header_index, header_levels, data):
+            view.release()
+        tasks = ((shm.name, j, arr, K_j) for j, (arr, (K_j, _)) in enumerate(zip(arrays, results)))
+        for _ in pool.imap_unordered(_fill_task, tasks, chunksize):
+            pass
+    return AldrArena(shm, owner=True)
@@ -0,0 +1,225 @@
+# Released under Apache 2.0; refer to LICENSE.txt
+
+# A sampling server for many preprocessed ALDR trees over a Unix socket, and a
+# local load generator for it.
+#
+# The server loads distributions from .dist files (preprocessed with
+# aldrflat.preprocess_aldr_flat) or from snapshots (see aldrsnapshot.py),
+# numbered 0, 1, ... in the order given. A request is the little-endian pair
+#   uint32 dist_id, uint32 count
+# and its reply is
+#   int32 status, uint32 count, then count int32 samples
+# where status is 0, or -1 for an unknown dist_id (with count = 0). Replies on
+# a connection are sent in the order of the requests, which may be pipelined.
+# All requests for the same distribution that arrive in one iteration of the
+# event loop are served by a single batch draw (sample_aldr_flat_batch).
+#
+# usage: python aldrserver.py serve SOCKET path.dist|path.snap ...
+#        python aldrserver.py bench SOCKET [--clients C] [--requests R]
+#            [--count N] [--files path ...]
+# With --files, bench starts its own server on SOCKET for the given files.
+
+import argparse
+import asyncio
+import collections
+import os
+import struct
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from aldrflat import preprocess_aldr_flat
+from aldrflat import sample_aldr_enc_batch
+from aldrflat import sample_aldr_flat_batch
+from aldrsnapshot import KIND_FLAT
+from aldrsnapshot import SNAPSHOT_MAGIC
+from aldrsnapshot import load_snapshot
+from customtree import read_dist
+
+request_struct = struct.Struct('<II')
+reply_struct = struct.Struct('<iI')
+
+def load_sampler(path):
+    # a function size -> samples for the distribution in path
+    with open(path, 'rb') as fp:
+        is_snapshot = fp.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC
+    if is_snapshot:
+        snapshot = load_snapshot(path)
+        batch = sample_aldr_flat_batch if snapshot.kind == KIND_FLAT else sample_aldr_enc_batch
+        tree = snapshot.tree
+    else:
+        batch = sample_aldr_flat_batch
+        tree = preprocess_aldr_flat(read_dist(path))
+    rng = np.random.default_rng()
+    return lambda size: batch(tree, size, rng)[0]
+
+class SampleServer:
+
+    def __init__(self, samplers):
+        self.samplers = samplers
+        self.pending = {}
+        self.num_requests = 0
+        self.num_batches = 0
+
+    def request(self, dist_id, count):
+        # future for the reply to sample(dist_id, count)
+        future = asyncio.get_running_loop().create_future()
+        if dist_id >= len(self.samplers):
+            future.set_result(reply_struct.pack(-1, 0))
+            return future
+        self.num_requests += 1
+        if dist_id not in self.pending:
+            self.pending[dist_id] = []
+            asyncio.get_running_loop().call_soon(self.flush, dist_id)
+        self.pending[dist_id].append((count, future))
+        return future
+
+    def flush(self, dist_id):
+        # draw all pending requests for dist_id in one batch
+        requests = self.pending.pop(dist_id)
+        samples = self.samplers[dist_id](sum(count for count, _ in requests)).astype('<i4')
+        self.num_batches += 1
+        start = 0
+        for count, future in requests:
+            if not future.cancelled():
+                future.set_result(reply_struct.pack(0, count) + samples[start:start+count].tobytes())
+            start += count
+
+    async def handle(self, reader, writer):
+        replies = asyncio.Queue()
+        async def send():
+            while (future := await replies.get()) is not None:
+                writer.write(await future)
+                await writer.drain()
+        sender = asyncio.create_task(send())
+        try:
+            while True:
+                request = await reader.readexactly(request_struct.size)
+                await replies.put(self.request(*request_struct.unpack(request)))
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        await replies.put(None)
+        try:
+            await sender
+        except ConnectionResetError:
+            pass
+        writer.close()
+
+async def serve(path, fnames):
+    server = SampleServer([load_sampler(fname) for fname in fnames])
+    if os.path.exists(path):
+        os.unlink(path)
+    unix_server = await asyncio.start_unix_server(server.handle, path)
+    print(f'serving {len(fnames)} distributions on {path}', flush=True)
+    async with unix_server:
+        await unix_server.serve_forever()
+
+class SampleClient:
+    # a connection to the server, with pipelined requests
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.lock = asyncio.Lock()
+        # (dist_id, future) of the requests sent, in order
+        self.waiting = collections.deque()
+
+    @classmethod
+    async def connect(cls, path):
+        return cls(*await asyncio.open_unix_connection(path))
+
+    async def sample(self, dist_id, count):
+        # count samples from distribution dist_id, as an int32 array
+        future = asyncio.get_running_loop().create_future()
+        self.waiting.append((dist_id, future))
+        self.writer.write(request_struct.pack(dist_id, count))
+        await self.writer.drain()
+        async with self.lock:
+            # replies arrive in order, so read until ours has arrived
+            while not future.done():
+                status, count = reply_struct.unpack(await self.reader.readexactly(reply_struct.size))
+                data = await self.reader.readexactly(4 * count)
+                waiter_id, waiter = self.waiting.popleft()
+                if status:
+                    waiter.set_exception(KeyError(waiter_id))
+                else:
+                    waiter.set_result(np.frombuffer(data, dtype='<i4'))
+        return future.result()
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+async def bench(path, num_dists, num_clients, num_requests, count):
+    # each client sends num_requests requests for count samples from random
+    # distributions, one at a time; returns the total time and latencies
+    latencies = []
+    async def client(seed):
+        rng = np.random.default_rng(seed)
+        conn = await SampleClient.connect(path)
+        for dist_id in rng.integers(0, num_dists, num_requests):
+            t = time.perf_counter()
+            samples = await conn.sample(int(dist_id), count)
+            latencies.append(time.perf_counter() - t)
+            assert len(samples) == count
+        await conn.close()
+    t = time.perf_counter()
+    await asyncio.gather(*(client(seed) for seed in range(num_clients)))
+    return time.perf_counter() - t, np.array(latencies)
+
+async def wait_for_socket(path, process, timeout = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('server exited')
+        try:
+            conn = await SampleClient.connect(path)
+            await conn.close()
+            return
+        except (FileNotFoundError, ConnectionRefusedError):
+            await asyncio.sleep(0.05)
+    raise TimeoutError(path)
+
+def main_bench(args):
+    process = None
+    if args.files:
+        process = subprocess.Popen([sys.executable, __file__, 'serve', args.socket, *args.files])
+    try:
+        if process is not None:
+            asyncio.run(wait_for_socket(args.socket, process))
+        num_dists = args.dists or len(args.files)
+        elapsed, latencies = asyncio.run(
+            bench(args.socket, num_dists, args.clients, args.requests, args.count))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    num_requests = len(latencies)
+    print('clients requests count elapsed requests_per_s samples_per_s latency_p50 latency_p90 latency_p99')
+    print(args.clients, num_requests, args.count, elapsed,
+          num_requests / elapsed, num_requests * args.count / elapsed,
+          *np.percentile(latencies, [50, 90, 99]))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest='command', required=True)
+    parser_serve = commands.add_parser('serve')
+    parser_serve.add_argument('socket')
+    parser_serve.add_argument('files', nargs='+')
+    parser_bench = commands.add_parser('bench')
+    parser_bench.add_argument('socket')
+    parser_bench.add_argument('--clients', type=int, default=16)
+    parser_bench.add_argument('--requests', type=int, default=1000)
+    parser_bench.add_argument('--count', type=int, default=100)
+    parser_bench.add_argument('--dists', type=int, default=0,
+        help='number of distributions on the server (default: number of --files)')
+    parser_bench.add_argument('--files', nargs='*', default=[])
+    args = parser.parse_args()
+    if args.command == 'serve':
+        asyncio.run(serve(args.socket, args.files))
+    else:
+        if not (args.files or args.dists):
+            parser.error('bench needs --files or --dists')
+        main_bench(args)
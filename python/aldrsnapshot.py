@@ -0,0 +1,165 @@
+# Released under Apache 2.0; refer to LICENSE.txt
+
+# Binary snapshots of preprocessed ALDR samplers (see aldrflat.py), which are
+# loaded by memory-mapping the file instead of rebuilding the tree.
+#
+# A snapshot is a little-endian header followed by int32 arrays:
+#   magic     8 bytes  b'ALDRSNAP'
+#   version   uint16   SNAPSHOT_VERSION
+#   kind      uint16   KIND_FLAT (breadths, leaves_flat) or KIND_ENC (enc)
+#   crc32     uint32   zlib.crc32 of the header (with crc32 = 0) and arrays
+#   n, K               uint64 each: ALDR[arr, K] for n weights
+#   c, r               uint128 each (low word first): c = 2^K // M and
+#                      r = 2^K % M, for depths K up to 126
+#   length1, length2   uint64 each: number of entries of the two arrays
+#                      (length2 is 0 for KIND_ENC)
+# The arrays start at HEADER_SIZE, a multiple of 8. A snapshot is written
+# to a temporary file in the same directory, flushed to disk, and renamed
+# over the destination, so readers see either the old or the new snapshot.
+# The file keeps the mode of the snapshot it replaces (or gets the mode
+# 0o666 & ~umask of a new file), rather than the 0o600 of mkstemp.
+# The arrays are read in place, so snapshots are only supported on
+# little-endian hosts. Loading checks the header and the file size only,
+# so that only the pages of the tree that are sampled are read; the CRC of
+# the whole file is checked with verify=True.
+
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import zlib
+
+from aldrflat import AldrFlat
+from aldrflat import aldr_depth
+from aldrflat import preprocess_aldr_enc
+from aldrflat import preprocess_aldr_flat
+from aldrflat import sample_aldr_enc
+from aldrflat import sample_aldr_flat
+
+SNAPSHOT_MAGIC = b'ALDRSNAP'
+SNAPSHOT_VERSION = 2
+KIND_FLAT = 1
+KIND_ENC = 2
+
+_header = struct.Struct('<8sHHI8Q')
+HEADER_SIZE = _header.size
+
+class SnapshotError(ValueError):
+    pass
+
+def _checksum(header, arrays):
+    crc = zlib.crc32(header)
+    for x in arrays:
+        crc = zlib.crc32(x, crc)
+    return crc
+
+def _split_u128(x):
+    return x & ((1 << 64) - 1), x >> 64
+
+def _pack_header(kind, n, K, c, r, arrays, crc = 0):
+    lengths = [len(x) for x in arrays] + [0] * (2 - len(arrays))
+    return _header.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, kind, crc, n, K,
+        *_split_u128(c), *_split_u128(r), *lengths)
+
+def _file_mode(path):
+    # the mode of path if it exists, else that of a newly created file
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+def write_snapshot(path, arr, K = None, kind = KIND_FLAT):
+    # preprocess ALDR[arr, K] and write it to path atomically
+    K = aldr_depth(arr) if K is None else K
+    if K >= 128:
+        raise SnapshotError(f'depth {K} does not fit in a snapshot')
+    M = sum(arr)
+    c, r = divmod(1 << K, M)
+    if kind == KIND_FLAT:
+        arrays = list(preprocess_aldr_flat(arr, K))
+    elif kind == KIND_ENC:
+        arrays = [preprocess_aldr_enc(arr, K)]
+    else:
+        raise SnapshotError(f'unknown snapshot kind {kind}')
+    assert all(x.itemsize == 4 for x in arrays) and sys.byteorder == 'little'
+    crc = _checksum(_pack_header(kind, len(arr), K, c, r, arrays), arrays)
+    dirname = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=dirname, prefix=os.path.basename(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(_pack_header(kind, len(arr), K, c, r, arrays, crc))
+            for x in arrays:
+                x.tofile(fp)
+            fp.flush()
+            os.fchmod(fp.fileno(), _file_mode(path))
+            os.fsync(fp.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    dirfd = os.open(dirname, os.O_RDONLY)
+    try:
+        os.fsync(dirfd)
+    finally:
+        os.close(dirfd)
+    return path
+
+class AldrSnapshot:
+    # a sampler backed by a memory-mapped snapshot; the arrays (tree) are
+    # views into the mapping, and must be deleted before close
+
+    def __init__(self, path, verify = False):
+        assert sys.byteorder == 'little'
+        with open(path, 'rb') as fp:
+            # mmap cannot map an empty file, so check the size first
+            if os.fstat(fp.fileno()).st_size < HEADER_SIZE:
+                raise SnapshotError(f'{path}: truncated header')
+            self.mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = memoryview(self.mmap)
+        magic, version, kind, crc, n, K, c_lo, c_hi, r_lo, r_hi, length1, length2 = _header.unpack_from(buf)
+        c, r = c_lo | (c_hi << 64), r_lo | (r_hi << 64)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION or kind not in (KIND_FLAT, KIND_ENC):
+            buf.release()
+            self.mmap.close()
+            raise SnapshotError(f'{path}: not a version {SNAPSHOT_VERSION} ALDR snapshot')
+        if len(buf) != HEADER_SIZE + 4 * (length1 + length2):
+            buf.release()
+            self.mmap.close()
+            raise SnapshotError(f'{path}: expected {length1 + length2} entries')
+        self.kind = kind
+        self.n, self.K, self.c, self.r = n, K, c, r
+        self.buf = buf
+        self.arrays = [buf[HEADER_SIZE:HEADER_SIZE + 4*length1].cast('i')]
+        if kind == KIND_FLAT:
+            self.arrays.append(buf[HEADER_SIZE + 4*length1:].cast('i'))
+        if verify and crc != _checksum(_pack_header(kind, n, K, c, r, self.arrays), self.arrays):
+            self.close()
+            raise SnapshotError(f'{path}: checksum mismatch')
+        self.tree = AldrFlat(*self.arrays) if kind == KIND_FLAT else self.arrays[0]
+
+    def sample(self):
+        if self.kind == KIND_FLAT:
+            return sample_aldr_flat(self.tree)
+        return sample_aldr_enc(self.tree)
+
+    def bytes(self):
+        return sum(4 * len(x) for x in self.arrays)
+
+    def close(self):
+        self.tree = None
+        for x in self.arrays:
+            x.release()
+        self.buf.release()
+        self.mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def load_snapshot(path, verify = False):
+    return AldrSnapshot(path, verify)
@@ -0,0 +1,140 @@
+# Released under Apache 2.0; refer to LICENSE.txt
+
+# Exact weighted alias method (Walker, Vose), translated from c/alias.c,
+# with the same interface as the ALDR samplers in customtree.py:
+# gen_alias_table(arr) builds the sampler, sample_alias(table) draws one
+# outcome using flip(), and get_alias_entropy(table) is its expected
+# entropy cost. The batched path sample_alias_batch runs the same
+# uniform and bernoulli procedures of c/flip.c on NumPy arrays. Its bits
+# are drawn with flip_n (from the source of set_flip_source, and counted by
+# get_num_flips, as for sample_alias), in a different order than one draw
+# at a time, unless a NumPy generator rng is given instead.
+
+import collections
+
+from array import array
+
+import numpy as np
+
+from customtree import bernoulli
+from customtree import bernoulli_entropy
+from customtree import flip_n
+from customtree import uniform
+from customtree import uniform_entropy
+
+# no_alias_odds[i] / weight_sum is the probability of keeping the
+# uniformly chosen index i instead of jumping to aliases[i]
+AliasTable = collections.namedtuple('AliasTable',
+    ['length', 'weight_sum', 'aliases', 'no_alias_odds'])
+
+def gen_alias_table(arr):
+    n = len(arr)
+    assert n > 0 and all(a >= 0 for a in arr)
+    weight_sum = sum(arr)
+    assert weight_sum > 0
+    no_alias_odds = array('Q', (a * n for a in arr))
+    aliases = array('I', bytes(4 * n))
+    smalls = [i for i in range(n) if no_alias_odds[i] < weight_sum]
+    bigs = [i for i in range(n) if no_alias_odds[i] >= weight_sum]
+    # find an alias with big weight for each index with small weight
+    while smalls and bigs:
+        small = smalls.pop()
+        big = bigs.pop()
+        aliases[small] = big
+        no_alias_odds[big] -= weight_sum - no_alias_odds[small]
+        if no_alias_odds[big] < weight_sum:
+            smalls.append(big)
+        else:
+            bigs.append(big)
+    # the remaining indices have no alias odds of exactly 100%
+    for i in smalls + bigs:
+        no_alias_odds[i] = weight_sum
+    return AliasTable(n, weight_sum, aliases, no_alias_odds)
+
+def sample_alias(table):
+    uniform_index = uniform(table.length)
+    if bernoulli(table.no_alias_odds[uniform_index], table.weight_sum):
+        return uniform_index
+    return table.aliases[uniform_index]
+
+def get_alias_entropy(table):
+    # expected entropy consumption (in bits) of sample_alias
+    n = table.length
+    return uniform_entropy(n) + sum(bernoulli_entropy(odds, table.weight_sum)
+        for odds in table.no_alias_odds) / n
+
+def bytes_alias_table(table):
+    return table.aliases.itemsize * len(table.aliases) \
+        + table.no_alias_odds.itemsize * len(table.no_alias_odds)
+
+FLIP_CHUNK_BITS = 4096
+
+def flip_integers(num_bits, size, rng = None):
+    # size integers of num_bits bits each, drawn with flip_n (in chunks of
+    # FLIP_CHUNK_BITS bits), or from the NumPy generator rng if given
+    if rng is not None:
+        return rng.integers(0, 1 << num_bits, size, dtype=np.int64)
+    total = num_bits * size
+    if not total:
+        return np.zeros(size, dtype=np.int64)
+    chunks = []
+    while total:
+        n = min(total, FLIP_CHUNK_BITS)
+        chunk = np.frombuffer(flip_n(n).to_bytes((n + 7) // 8, 'big'), dtype=np.uint8)
+        chunks.append(np.unpackbits(chunk)[-n:])
+        total -= n
+    bits = np.concatenate(chunks).astype(np.int64).reshape(size, num_bits)
+    return bits @ (1 << np.arange(num_bits - 1, -1, -1, dtype=np.int64))
+
+def uniform_batch(n, size, rng = None):
+    # size draws of uniform(n) and the total number of bits consumed
+    num_bits_presample = (n-1).bit_length()
+    bound = 1 << num_bits_presample
+    x = flip_integers(num_bits_presample, size, rng)
+    bits = num_bits_presample * size
+    out = np.empty(size, dtype=np.int64)
+    active = np.arange(size)
+    while active.size:
+        if bound >= n:
+            done = x < n
+            out[active[done]] = x[done]
+            active = active[~done]
+            x = x[~done] - n
+            bound -= n
+            if not active.size:
+                break
+        bound <<= 1
+        x = (x << 1) | flip_integers(1, active.size, rng)
+        bits += active.size
+    return out, bits
+
+def bernoulli_batch(numer, denom, rng = None):
+    # draws of bernoulli(numer[i], denom) and the total number of bits consumed
+    numer = numer.astype(np.int64)
+    out = numer == denom
+    active = np.flatnonzero((numer > 0) & (numer < denom))
+    numer = numer[active]
+    bits = 0
+    while active.size:
+        numer <<= 1
+        b = flip_integers(1, active.size, rng).astype(bool)
+        bits += active.size
+        exact = numer == denom
+        y = numer > denom
+        numer -= denom * y
+        out[active[exact]] = b[exact]
+        done = b & ~exact
+        out[active[done]] = y[done]
+        keep = ~(b | exact)
+        active = active[keep]
+        numer = numer[keep]
+    return out, bits
+
+def sample_alias_batch(table, size, rng = None):
+    # size independent draws of sample_alias, and the total number of bits
+    # consumed (which get_num_flips also counts, unless rng is given)
+    aliases = np.frombuffer(table.aliases, dtype=np.uint32)
+    no_alias_odds = np.frombuffer(table.no_alias_odds, dtype=np.uint64)
+    uniform_index, bits_uniform = uniform_batch(table.length, size, rng)
+    keep, bits_bernoulli = bernoulli_batch(no_alias_odds[uniform_index], table.weight_sum, rng)
+    return np.where(keep, uniform_index, aliases[uniform_index]), bits_uniform + bits_bernoulli
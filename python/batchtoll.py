@@ -0,0 +1,98 @@
+# Released under Apache 2.0; refer to LICENSE.txt
+
+# Vectorized tolls of ALDR trees for many distributions at once, i.e.,
+#   get_tree_entropy(gen_fldr_tree(A, K)) - H(A)
+# for each row A, using the closed form of the expected cost
+#   (2^K / (c M)) (nu(r, K) + sum_i nu(c a_i, K)),  c = 2^K // M,  r = 2^K % M.
+#
+# Rows are given either as a padded 2-D array (zero weights are padding,
+# which does not change the toll) or as a ragged pair (values, offsets),
+# where row j is values[offsets[j]:offsets[j+1]]. Depths are a scalar or
+# one per row (2k by default) and must satisfy K <= 63.
+
+import numpy as np
+
+MAX_DEPTH = 63
+
+def bit_length(x):
+    # elementwise int.bit_length for an array of non-negative integers
+    x = np.asarray(x, dtype=np.uint64).copy()
+    length = np.zeros(x.shape, dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        big = x >= (np.uint64(1) << np.uint64(shift))
+        length[big] += shift
+        x[big] >>= np.uint64(shift)
+    return length + (x > 0)
+
+# _NU_MASKS[t] selects the bit positions 0 <= j < 32 whose index j has bit t set,
+# so that sum_j j*bit_j*2^j = sum_t 2^t (x & _NU_MASKS[t])
+_NU_MASKS = [sum(1 << j for j in range(32) if (j >> t) & 1) for t in range(5)]
+
+def nu_low(x, K):
+    # nu(x, K) for x < 2^32 as 2^-K (K x - sum_j j*bit_j*2^j), computed exactly in int64
+    g = np.zeros(x.shape, dtype=np.int64)
+    for t, mask in enumerate(_NU_MASKS):
+        g += (x & mask) << t
+    return np.ldexp((K * x - g).astype(np.float64), -K)
+
+def nu_array(N, K):
+    # elementwise nu(N, K) (see customtree.nu) for N < 2^64 and K <= 63,
+    # split into the low and high 32 bits of N
+    N = np.asarray(N, dtype=np.uint64)
+    K = np.broadcast_to(np.asarray(K, dtype=np.int64), N.shape)
+    lo = (N & np.uint64(0xffffffff)).astype(np.int64)
+    hi = (N >> np.uint64(32)).astype(np.int64)
+    return nu_low(lo, K) + nu_low(hi, K - 32)
+
+def ragged_from_padded(W):
+    # convert a padded 2-D array of weights to (values, offsets)
+    W = np.asarray(W, dtype=np.uint64)
+    mask = W > 0
+    offsets = np.zeros(W.shape[0] + 1, dtype=np.int64)
+    np.cumsum(mask.sum(axis=1), out=offsets[1:])
+    return W[mask], offsets
+
+def batch_tolls(values, offsets, K = None):
+    # tolls of ALDR[A_j, K_j] for each ragged row A_j; also returns the
+    # expected costs and the depths used, as (tolls, costs, K)
+    values = np.asarray(values, dtype=np.uint64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    num_rows = len(offsets) - 1
+    lengths = np.diff(offsets)
+    assert num_rows > 0 and (lengths > 0).all()
+    row = np.repeat(np.arange(num_rows), lengths)
+
+    M = np.add.reduceat(values, offsets[:-1])
+    if K is None:
+        K = 2 * bit_length(M - np.uint64(1))
+    K = np.broadcast_to(np.asarray(K, dtype=np.int64), (num_rows,)).copy()
+    assert (K <= MAX_DEPTH).all() and (K >= bit_length(M - np.uint64(1))).all()
+
+    p2K = np.uint64(1) << K.astype(np.uint64)
+    c = p2K // M
+    r = p2K % M
+    pass_cost = nu_array(r, K) + np.bincount(row, nu_array(c[row] * values, K[row]), num_rows)
+    costs = pass_cost * (p2K.astype(np.float64) / (c.astype(np.float64) * M))
+
+    a = values.astype(np.float64)
+    alog2a = np.bincount(row, a * np.log2(a, where=a > 0, out=np.zeros_like(a)), num_rows)
+    Mf = M.astype(np.float64)
+    entropies = np.log2(Mf) - alog2a / Mf
+    return costs - entropies, costs, K
+
+def batch_tolls_padded(W, K = None):
+    return batch_tolls(*ragged_from_padded(W), K)
+
+def search_pairs(r_max, chunk = 1 << 20):
+    # the distribution [1, r] with the largest toll of ALDR[[1, r], 2k]
+    # for 1 <= r <= r_max, as (toll, cost, r)
+    best = (-np.inf, 0.0, 0)
+    for lo in range(1, r_max + 1, chunk):
+        r = np.arange(lo, min(lo + chunk, r_max + 1), dtype=np.uint64)
+        values = np.stack([np.ones_like(r), r], axis=1).ravel()
+        offsets = np.arange(0, 2 * len(r) + 1, 2)
+        tolls, costs, _ = batch_tolls(values, offsets)
+        j = int(np.argmax(tolls))
+        if tolls[j] > best[0]:
+            best = (float(tolls[j]), float(costs[j]), int(r[j]))
+    return best
@@ -0,0 +1,80 @@
+# Released under Apache 2.0; refer to LICENSE.txt
+
+# Block sampling of i.i.d. tuples from P^t.
+#
+# Each ALDR sample costs up to 2 bits more than H(P). A block of b i.i.d.
+# outcomes is one sample from the product distribution P^b, whose ALDR tree
+# has a toll below 2 bits for the whole block, i.e., below 2/b bits per
+# outcome. The tree for P^b has one outcome per b-tuple of the support of P
+# (tuples are numbered in base n, first outcome most significant), so its
+# size grows as n^b. A BlockSampler therefore draws t-tuples as t // b
+# samples from the table for P^b and one from the table for P^(t % b),
+# where b <= t is the largest block size whose table fits in max_bytes
+# (bounded by block_bytes); if t is not given, t = b. Tables are built on
+# first use.
+
+from aldrflat import aldr_depth
+from aldrflat import bytes_aldr_flat
+from aldrflat import get_aldr_flat_entropy
+from aldrflat import preprocess_aldr_flat
+from aldrflat import sample_aldr_flat
+
+BLOCK_MAX_BYTES = 1 << 20
+BLOCK_MAX_SIZE = 64
+
+def product_weights(weights, b):
+    # weights of P^b, indexed by the b-tuples of outcomes in base len(weights)
+    product = [1]
+    for _ in range(b):
+        product = [x * a for x in product for a in weights]
+    return product
+
+def block_bytes(weights, b):
+    # upper bound on bytes_aldr_flat of the table for P^b: at most K leaves
+    # per outcome and for the reject weight, and K+1 breadths
+    K = aldr_depth([sum(weights)**b])
+    return 4 * (K + 1) + 4 * K * (len(weights)**b + 1)
+
+def block_size(weights, max_bytes = BLOCK_MAX_BYTES, max_size = BLOCK_MAX_SIZE):
+    # largest b <= max_size with block_bytes(weights, b) <= max_bytes (at least 1)
+    b = 1
+    while b < max_size and block_bytes(weights, b + 1) <= max_bytes:
+        b += 1
+    return b
+
+class BlockSampler:
+
+    def __init__(self, arr, t = None, max_bytes = BLOCK_MAX_BYTES):
+        self.support = [i for i, a in enumerate(arr) if a]
+        self.weights = [arr[i] for i in self.support]
+        assert self.weights
+        b = block_size(self.weights, max_bytes, BLOCK_MAX_SIZE if t is None else t)
+        self.t = b if t is None else t
+        self.blocks = [b] * (self.t // b) + ([self.t % b] if self.t % b else [])
+        self.tables = {}
+
+    def table(self, b):
+        # the flattened ALDR tree for P^b
+        if b not in self.tables:
+            self.tables[b] = preprocess_aldr_flat(product_weights(self.weights, b))
+        return self.tables[b]
+
+    def sample(self):
+        # a t-tuple of i.i.d. outcomes
+        n = len(self.weights)
+        out = []
+        for b in self.blocks:
+            j = sample_aldr_flat(self.table(b))
+            digits = []
+            for _ in range(b):
+                j, d = divmod(j, n)
+                digits.append(self.support[d])
+            out.extend(reversed(digits))
+        return tuple(out)
+
+    def bytes(self):
+        return sum(bytes_aldr_flat(self.table(b)) for b in set(self.blocks))
+
+    def entropy(self):
+        # expected bits consumed per outcome (not per tuple)
+        return sum(get_aldr_flat_entropy(self.table(b)) for b in self.blocks) / self.t
@@ -0,0 +1,253 @@
+# Released under Apache 2.0; refer to LICENSE.txt
+
+# ctypes binding to the C samplers in ../c (aldr.c, alias.c, recycle.c,
+# flip.c), built
+# as a shared library with `make libaldr.so` in ../c.
+#
+# Weights are passed as NumPy arrays, samples are written into caller
+# provided int32 (uint32 for the alias method) buffers, and the bit source
+# of flip.c is shared by all samplers, with its number of consumed bits
+# given by get_num_flips (as in main.c).
+
+import ctypes
+import os
+
+import numpy as np
+
+libaldr_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'c', 'libaldr.so')
+
+class AldrFlatStruct(ctypes.Structure):
+    _fields_ = [
+        ('length_breadths', ctypes.c_int),
+        ('length_leaves_flat', ctypes.c_int),
+        ('breadths', ctypes.POINTER(ctypes.c_int)),
+        ('leaves_flat', ctypes.POINTER(ctypes.c_int)),
+    ]
+
+class AldrLutStruct(ctypes.Structure):
+    _fields_ = [
+        ('d', ctypes.c_int),
+        ('location_d', ctypes.c_int),
+        ('table', ctypes.POINTER(ctypes.c_int)),
+        ('flat', AldrFlatStruct),
+    ]
+
+class ArrayStruct(ctypes.Structure):
+    _fields_ = [
+        ('length', ctypes.c_int),
+        ('a', ctypes.POINTER(ctypes.c_int)),
+    ]
+
+class AliasStruct(ctypes.Structure):
+    _fields_ = [
+        ('length', ctypes.c_uint32),
+        ('weight_sum', ctypes.c_uint32),
+        ('aliases', ctypes.POINTER(ctypes.c_uint32)),
+        ('no_alias_odds', ctypes.POINTER(ctypes.c_uint32)),
+    ]
+
+class RecycleStruct(ctypes.Structure):
+    _fields_ = [
+        ('length', ctypes.c_uint32),
+        ('cumulative', ctypes.POINTER(ctypes.c_uint32)),
+    ]
+
+_int_array = np.ctypeslib.ndpointer(dtype=np.int32, flags='C_CONTIGUOUS')
+_uint32_array = np.ctypeslib.ndpointer(dtype=np.uint32, flags='C_CONTIGUOUS')
+_uint64_array = np.ctypeslib.ndpointer(dtype=np.uint64, flags='C_CONTIGUOUS')
+
+def _declare(lib, name, restype, *argtypes):
+    f = getattr(lib, name)
+    f.restype = restype
+    f.argtypes = argtypes
+
+def load_library(path = libaldr_path):
+    lib = ctypes.CDLL(path)
+    for name in ('preprocess_aldr_flat_k', 'preprocess_aldr_enc_k',
+                 'preprocess_aldr_flat_depth', 'preprocess_aldr_enc_depth'):
+        _declare(lib, name, AldrFlatStruct if 'flat' in name else ArrayStruct,
+                 _int_array, ctypes.c_int, ctypes.c_int)
+    for name in ('preprocess_aldr_flat_k_u64', 'preprocess_aldr_enc_k_u64',
+                 'preprocess_aldr_flat_depth_u64', 'preprocess_aldr_enc_depth_u64'):
+        _declare(lib, name, AldrFlatStruct if 'flat' in name else ArrayStruct,
+                 _uint64_array, ctypes.c_int, ctypes.c_int)
+    _declare(lib, 'preprocess_aldr_lut', AldrLutStruct, _int_array, ctypes.c_int)
+    _declare(lib, 'preprocess_weighted_alias', AliasStruct, _int_array, ctypes.c_int)
+    _declare(lib, 'sample_aldr_flat_n', None, ctypes.POINTER(AldrFlatStruct), _int_array, ctypes.c_int)
+    _declare(lib, 'sample_aldr_enc_n', None, ctypes.POINTER(ArrayStruct), _int_array, ctypes.c_int)
+    _declare(lib, 'sample_aldr_lut_n', None, ctypes.POINTER(AldrLutStruct), _int_array, ctypes.c_int)
+    _declare(lib, 'preprocess_recycle', RecycleStruct, _int_array, ctypes.c_int)
+    _declare(lib, 'sample_recycle_n', None, ctypes.POINTER(RecycleStruct), _uint32_array, ctypes.c_int)
+    _declare(lib, 'bytes_sample_recycle', ctypes.c_int, ctypes.POINTER(RecycleStruct))
+    _declare(lib, 'free_recycle_s', None, RecycleStruct)
+    _declare(lib, 'reset_recycle', None)
+    _declare(lib, 'sample_weighted_alias_index_n', None, ctypes.POINTER(AliasStruct), _uint32_array, ctypes.c_int)
+    _declare(lib, 'bytes_sample_aldr_flat', ctypes.c_int, ctypes.POINTER(AldrFlatStruct))
+    _declare(lib, 'bytes_sample_aldr_lut', ctypes.c_int, ctypes.POINTER(AldrLutStruct))
+    _declare(lib, 'bytes_array', ctypes.c_int, ctypes.POINTER(ArrayStruct))
+    _declare(lib, 'bytes_sample_weighted_alias_index', ctypes.c_int, ctypes.POINTER(AliasStruct))
+    _declare(lib, 'free_aldr_flat_s', None, AldrFlatStruct)
+    _declare(lib, 'free_aldr_lut_s', None, AldrLutStruct)
+    _declare(lib, 'free_array_s', None, ArrayStruct)
+    _declare(lib, 'free_sample_weighted_alias_index', None, AliasStruct)
+    return lib
+
+try:
+    lib = load_library()
+except OSError as e:
+    raise ImportError(f'{e}; build it with `make libaldr.so` in ../c') from e
+
+aldr_lut_cache_bytes = ctypes.c_int.in_dll(lib, 'aldr_lut_cache_bytes')
+NUM_RNG_CALLS = ctypes.c_uint64.in_dll(lib, 'NUM_RNG_CALLS')
+flip_k = ctypes.c_uint32.in_dll(lib, 'flip_k')
+flip_pos = ctypes.c_uint32.in_dll(lib, 'flip_pos')
+
+_default_flip_k = flip_k.value
+
+def set_flip_source(osrng = False):
+    # the bit source of main.c: rand() by default, getrandom for osrng
+    reset_flips()
+    flip_k.value = 32 if osrng else _default_flip_k
+
+def reset_flips():
+    # discard buffered bits (and the recycled uniform state) and reset the counter
+    NUM_RNG_CALLS.value = 0
+    flip_pos.value = 0
+    lib.reset_recycle()
+
+def get_num_flips():
+    # number of bits consumed since the last reset_flips
+    return NUM_RNG_CALLS.value * flip_k.value - flip_pos.value
+
+# preprocess_aldr_*_k computes 2^K in a long long, so K = kmul * k <= 62;
+# the *_u64 versions (for uint64 weights with sum at most 2^63) use 128-bit
+# arithmetic, so K <= 126
+MAX_DEPTH = 62
+MAX_DEPTH_U64 = 126
+
+def _weights(arr, kmul = 1, K = None):
+    a = np.ascontiguousarray(arr, dtype=np.int32)
+    M = int(a.sum(dtype=np.int64))
+    assert a.ndim == 1 and len(a) and (a >= 0).all() and M < 1 << 31
+    k = (M-1).bit_length()
+    assert kmul * k <= MAX_DEPTH if K is None else k <= K <= MAX_DEPTH
+    return a
+
+def _weights_u64(arr, kmul = 1, K = None):
+    a = np.ascontiguousarray(arr, dtype=np.uint64)
+    M = sum(int(x) for x in a)
+    assert a.ndim == 1 and len(a) and M <= 1 << 63
+    k = (M-1).bit_length()
+    assert kmul * k <= MAX_DEPTH_U64 if K is None else k <= K <= MAX_DEPTH_U64
+    return a
+
+def _needs_u64(arr, kmul, K):
+    # whether the weights or the depth are out of range of the int preprocessors
+    M = sum(int(x) for x in arr)
+    return M >= 1 << 31 or (kmul * (M-1).bit_length() if K is None else K) > MAX_DEPTH
+
+class CSampler:
+    # a preprocessed C sampler, freed by close (or when garbage collected)
+
+    _free = None
+    _bytes = None
+    _sample_n = None
+    dtype = np.int32
+    struct = None
+
+    def __init__(self, struct):
+        self.struct = struct
+
+    def sample(self, out):
+        # fill the buffer out with samples and return it
+        assert out.dtype == self.dtype and out.flags.c_contiguous
+        getattr(lib, self._sample_n)(ctypes.byref(self.struct), out, len(out))
+        return out
+
+    def sample_n(self, count):
+        return self.sample(np.empty(count, dtype=self.dtype))
+
+    def bytes(self):
+        return getattr(lib, self._bytes)(ctypes.byref(self.struct))
+
+    def close(self):
+        if self.struct is not None:
+            getattr(lib, self._free)(self.struct)
+            self.struct = None
+
+    def __del__(self):
+        self.close()
+
+class CAldrFlat(CSampler):
+    _free = 'free_aldr_flat_s'
+    _bytes = 'bytes_sample_aldr_flat'
+    _sample_n = 'sample_aldr_flat_n'
+
+    def __init__(self, arr, kmul = 2, K = None):
+        # ALDR at depth K = kmul * k, or at depth K if given; weights with
+        # sum at least 2^31 or depths above 62 use the uint64 preprocessor
+        if _needs_u64(arr, kmul, K):
+            super().__init__(lib.preprocess_aldr_flat_k_u64(_weights_u64(arr, kmul), len(arr), kmul)
+                if K is None else lib.preprocess_aldr_flat_depth_u64(_weights_u64(arr, K=K), len(arr), K))
+        elif K is None:
+            super().__init__(lib.preprocess_aldr_flat_k(_weights(arr, kmul), len(arr), kmul))
+        else:
+            super().__init__(lib.preprocess_aldr_flat_depth(_weights(arr, K=K), len(arr), K))
+
+    def breadths(self):
+        return np.ctypeslib.as_array(self.struct.breadths, (self.struct.length_breadths,)).copy()
+
+    def leaves_flat(self):
+        return np.ctypeslib.as_array(self.struct.leaves_flat, (self.struct.length_leaves_flat,)).copy()
+
+class CAldrEnc(CSampler):
+    _free = 'free_array_s'
+    _bytes = 'bytes_array'
+    _sample_n = 'sample_aldr_enc_n'
+
+    def __init__(self, arr, kmul = 2, K = None):
+        if _needs_u64(arr, kmul, K):
+            super().__init__(lib.preprocess_aldr_enc_k_u64(_weights_u64(arr, kmul), len(arr), kmul)
+                if K is None else lib.preprocess_aldr_enc_depth_u64(_weights_u64(arr, K=K), len(arr), K))
+        elif K is None:
+            super().__init__(lib.preprocess_aldr_enc_k(_weights(arr, kmul), len(arr), kmul))
+        else:
+            super().__init__(lib.preprocess_aldr_enc_depth(_weights(arr, K=K), len(arr), K))
+
+    def enc(self):
+        return np.ctypeslib.as_array(self.struct.a, (self.struct.length,)).copy()
+
+class CAldrLut(CSampler):
+    _free = 'free_aldr_lut_s'
+    _bytes = 'bytes_sample_aldr_lut'
+    _sample_n = 'sample_aldr_lut_n'
+
+    def __init__(self, arr):
+        # ALDR at depth 2k, with a lookup table of aldr_lut_cache_bytes bytes
+        # at most for its top levels
+        super().__init__(lib.preprocess_aldr_lut(_weights(arr, 2), len(arr)))
+
+    def d(self):
+        return self.struct.d
+
+    def table(self):
+        return np.ctypeslib.as_array(self.struct.table, (1 << self.struct.d,)).copy()
+
+class CAlias(CSampler):
+    _free = 'free_sample_weighted_alias_index'
+    _bytes = 'bytes_sample_weighted_alias_index'
+    _sample_n = 'sample_weighted_alias_index_n'
+    dtype = np.uint32
+
+    def __init__(self, arr):
+        super().__init__(lib.preprocess_weighted_alias(_weights(arr), len(arr)))
+
+class CRecycle(CSampler):
+    # randomness recycling (recycle.c), with its uniform state kept across samples
+    _free = 'free_recycle_s'
+    _bytes = 'bytes_sample_recycle'
+    _sample_n = 'sample_recycle_n'
+    dtype = np.uint32
+
+    def __init__(self, arr):
+        super().__init__(lib.preprocess_recycle(_weights(arr), len(arr)))
@@ -1,8 +1,10 @@
 # Released under Apache 2.0; refer to LICENSE.txt
 
 import collections
+import contextlib
 import math
 import random
+import time
 import matplotlib.ticker as ticker
 import matplotlib.pyplot as plt
 from pathlib import Path
@@ -29,8 +31,140 @@ def get_binary_expansion_length(M):
 def count_trailing_zeros(x):
     return (x & -x).bit_length() - 1
 
+# random bits are buffered as in c/flip.c: each call to flip_source yields a
+# word of flip_k bits, and the number of bits consumed so far is
+# NUM_RNG_CALLS * flip_k - flip_pos (see get_num_flips)
+NUM_RNG_CALLS = 0
+flip_k = 32
+flip_word = 0
+flip_pos = 0
+flip_source = random.getrandbits
+
 def flip():
-    return random.binomialvariate()
+    global NUM_RNG_CALLS, flip_word, flip_pos
+    if not flip_pos:
+        NUM_RNG_CALLS += 1
+        flip_word = flip_source(flip_k)
+        flip_pos = flip_k
+    flip_pos -= 1
+    return (flip_word >> flip_pos) & 1
+
+def flip_n(n):
+    # n random bits as an integer, most significant bit first
+    global NUM_RNG_CALLS, flip_word, flip_pos
+    x = 0
+    while n:
+        if not flip_pos:
+            NUM_RNG_CALLS += 1
+            flip_word = flip_source(flip_k)
+            flip_pos = flip_k
+        num_bits_extract = min(n, flip_pos)
+        flip_pos -= num_bits_extract
+        x = (x << num_bits_extract) | ((flip_word >> flip_pos) & ((1 << num_bits_extract) - 1))
+        n -= num_bits_extract
+    return x
+
+def flip_peek(n):
+    # (x, m): the next m = min(n, number of buffered bits) bits as the top
+    # bits of the n-bit integer x (most significant bit first), without
+    # consuming them, after a refill of an empty buffer; consume them with
+    # flip_skip, after which the next bits come from the next word
+    global NUM_RNG_CALLS, flip_word, flip_pos
+    if not flip_pos:
+        NUM_RNG_CALLS += 1
+        flip_word = flip_source(flip_k)
+        flip_pos = flip_k
+    if flip_pos < n:
+        return (flip_word & ((1 << flip_pos) - 1)) << (n - flip_pos), flip_pos
+    return (flip_word >> (flip_pos - n)) & ((1 << n) - 1), n
+
+def flip_skip(n):
+    # consume n bits returned by flip_peek
+    global flip_pos
+    flip_pos -= n
+
+def uniform(n):
+    # uniform integer in [0, n), as uniform in c/flip.c
+    num_bits_presample = (n-1).bit_length()
+    bound = 1 << num_bits_presample
+    x = flip_n(num_bits_presample)
+    while True:
+        if bound >= n:
+            if x < n:
+                return x
+            bound -= n
+            x -= n
+        bound <<= 1
+        x = (x << 1) | flip()
+
+def bernoulli(numer, denom):
+    # 1 with probability numer/denom, as bernoulli in c/flip.c
+    if numer == 0:
+        return 0
+    if numer == denom:
+        return 1
+    while True:
+        numer <<= 1
+        if numer == denom:
+            return flip()
+        y = numer > denom
+        if y:
+            numer -= denom
+        if flip():
+            return int(y)
+
+def uniform_entropy(n):
+    # expected number of bits consumed by uniform(n); the bound in uniform
+    # follows the same sequence for every run, so only the probability of
+    # reaching each step needs to be tracked
+    num_bits_presample = (n-1).bit_length()
+    bound = 1 << num_bits_presample
+    cost = num_bits_presample
+    reach = 1.0
+    while reach > 2**-60:
+        if bound >= n:
+            reach *= (bound - n) / bound
+            bound -= n
+        bound <<= 1
+        cost += reach
+    return cost
+
+def bernoulli_entropy(numer, denom):
+    # expected number of bits consumed by bernoulli(numer, denom)
+    if numer == 0 or numer == denom:
+        return 0
+    cost = 0
+    reach = 1.0
+    while reach > 2**-60:
+        cost += reach
+        numer <<= 1
+        if numer == denom:
+            break
+        if numer > denom:
+            numer -= denom
+        reach /= 2
+    return cost
+
+def set_flip_source(osrng = False):
+    # use the operating system's random source (like the .osrng samplers in c/),
+    # the default Mersenne twister, or a given random.Random (e.g. seeded),
+    # and reset the bit counter
+    global flip_source
+    if isinstance(osrng, random.Random):
+        flip_source = osrng.getrandbits
+    else:
+        flip_source = random.SystemRandom().getrandbits if osrng else random.getrandbits
+    reset_flips()
+
+def reset_flips():
+    global NUM_RNG_CALLS, flip_word, flip_pos
+    NUM_RNG_CALLS = 0
+    flip_word = 0
+    flip_pos = 0
+
+def get_num_flips():
+    # number of random bits consumed since the last reset
+    return NUM_RNG_CALLS * flip_k - flip_pos
 
 def tree_depth(tree):
     # if all nodes in the last level for KY are reject nodes, then this is an artifact of my representation,
@@ -72,42 +206,144 @@ def multisample(tree, n):
 # case of rational discrete distributions. It is optimized for simplicity rather
 # than speed, to allow more convenient experimentation.
 
-def gen_ky_tree(arr, array_index_to_label = lambda i: i):
-    tree = []
+# Opt-in profiling of the tree builders: pass profile=new_profile() to
+# iter_ky_levels, gen_ky_tree, or gen_fldr_tree to accumulate the time spent in
+# each phase (gcd normalization, cache lookups, building levels, and rewriting
+# the rejection leaves of FLDR/ALDR trees), the number of levels and nodes
+# generated, and the width of the widest level. With profile=None (the
+# default), nothing is recorded.
+
+profile_phases = ('gcd', 'cache', 'levels', 'reject_rewrite')
+
+def new_profile():
+    profile = {'time_%s' % (phase,): 0.0 for phase in profile_phases}
+    profile.update(num_levels=0, num_nodes=0, peak_width=0, num_gcd_reductions=0, cache_size=0)
+    return profile
+
+def merge_profiles(total, profile):
+    # accumulate profile into total (peak_width is a maximum, the rest are sums)
+    for key, value in profile.items():
+        total[key] = max(total[key], value) if key == 'peak_width' else total[key] + value
+    return total
+
+class _ProfilePhase:
+    # context manager adding the elapsed time to profile['time_' + phase]
+    __slots__ = ('profile', 'key', 'start')
+
+    def __init__(self, profile, phase):
+        self.profile = profile
+        self.key = 'time_' + phase
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.profile[self.key] += time.perf_counter() - self.start
+
+_no_profile_phase = contextlib.nullcontext()
+
+def _phase(profile, phase):
+    return _no_profile_phase if profile is None else _ProfilePhase(profile, phase)
+
+def _profile_level(profile, level):
+    if profile is not None:
+        profile['num_levels'] += 1
+        profile['num_nodes'] += len(level)
+        profile['peak_width'] = max(profile['peak_width'], len(level))
+
+def iter_ky_levels(arr, array_index_to_label = lambda i: i, profile = None):
+    # generate the levels of the KY tree one at a time (see gen_ky_tree), keeping
+    # the state of the expansion (live nodes and residual weights) between levels
     n = len(arr)
-    g = math.gcd(*arr)
-    A = tuple(a//g for a in arr)
+    with _phase(profile, 'gcd'):
+        g = math.gcd(*arr)
+        A = tuple(a//g for a in arr)
     M = sum(A)
     depth = 0
     cache = {}
     live_nodes_ky_l = [1]
     
     while True:
-        bound = (M + live_nodes_ky_l[-1] - 1) // live_nodes_ky_l[-1]
-        level = [('accept', array_index_to_label(i)) for i in range(n) if A[i] >= bound]
-        if level:
-            A = tuple(A[i]*live_nodes_ky_l[-1] - (M if A[i] >= bound else 0) for i in range(n))
-            live_nodes_ky_l[-1] -= len(level)
-            M *= live_nodes_ky_l[-1]
-        tree.append(level)
+        with _phase(profile, 'levels'):
+            bound = (M + live_nodes_ky_l[-1] - 1) // live_nodes_ky_l[-1]
+            level = [('accept', array_index_to_label(i)) for i in range(n) if A[i] >= bound]
+            if level:
+                A = tuple(A[i]*live_nodes_ky_l[-1] - (M if A[i] >= bound else 0) for i in range(n))
+                live_nodes_ky_l[-1] -= len(level)
+                M *= live_nodes_ky_l[-1]
 
         if not M:
-            return tree
-        if (g := math.gcd(*A)) > 1:
-            M //= g
-            A = tuple(a // g for a in A)
+            _profile_level(profile, level)
+            yield level
+            return
+        with _phase(profile, 'gcd'):
+            if (g := math.gcd(*A)) > 1:
+                M //= g
+                A = tuple(a // g for a in A)
+                if profile is not None:
+                    profile['num_gcd_reductions'] += 1
 
-        reject_depth = cache.get((live_nodes_ky_l[-1],A), depth)
+        with _phase(profile, 'cache'):
+            reject_depth = cache.get((live_nodes_ky_l[-1],A), depth)
         if reject_depth != depth:
             reject_node = ('reject', reject_depth)
             assert live_nodes_ky_l[reject_depth] == live_nodes_ky_l[-1]
-            tree[-1] = [reject_node]*live_nodes_ky_l[-1] + tree[-1]
-            return tree
+            level = [reject_node]*live_nodes_ky_l[-1] + level
+            _profile_level(profile, level)
+            yield level
+            return
 
-        cache[(live_nodes_ky_l[-1],A)] = depth
+        _profile_level(profile, level)
+        yield level
+        with _phase(profile, 'cache'):
+            cache[(live_nodes_ky_l[-1],A)] = depth
+        if profile is not None:
+            profile['cache_size'] += 1
         live_nodes_ky_l.append(live_nodes_ky_l[-1] << 1)
         depth += 1
 
+def gen_ky_tree(arr, array_index_to_label = lambda i: i, profile = None):
+    return list(iter_ky_levels(arr, array_index_to_label, profile))
+
+class LazyKYTree:
+    # KY tree whose levels are generated when they are first accessed, so that
+    # memory is proportional to the depth reached by sampling, e.g.,
+    # sample(LazyKYTree(A)). Iterating over the tree or taking its length
+    # generates all levels (as needed by get_tree_entropy and tree_depth).
+
+    def __init__(self, arr, array_index_to_label = lambda i: i, profile = None):
+        self.levels = []
+        self.pending = iter_ky_levels(arr, array_index_to_label, profile)
+
+    def expand(self, depth = None):
+        # generate the levels up to depth (or all levels)
+        while self.pending is not None and (depth is None or len(self.levels) <= depth):
+            level = next(self.pending, None)
+            if level is None:
+                self.pending = None
+            else:
+                self.levels.append(level)
+
+    def __getitem__(self, depth):
+        self.expand(depth if depth >= 0 else None)
+        return self.levels[depth]
+
+    def __len__(self):
+        self.expand()
+        return len(self.levels)
+
+    def __iter__(self):
+        self.expand()
+        return iter(self.levels)
+
+def read_dist(path):
+    # read the weights of a distribution in the format of distributions/*.dist
+    with open(path) as fp:
+        M = int(fp.readline())
+        n, *arr = map(int, fp.readline().split())
+    assert n == len(arr) and M == sum(arr)
+    return arr
+
 def sample_b10(arr, power = 4, gen = gen_ky_tree):
     tree = gen(arr)
     return multisample(tree, (10**power)*sum(arr))
@@ -160,7 +396,7 @@ def H(A):
     return sum(a * math.log2(M/a) for a in A) / M
 
 
-def gen_fldr_tree(arr, max_depth = None):
+def gen_fldr_tree(arr, max_depth = None, profile = None):
     # generate the FLDR tree (if max_depth is None)
     # or an ALDR tree with depth max_depth
     n = len(arr)
@@ -170,13 +406,14 @@ def gen_fldr_tree(arr, max_depth = None):
         assert K <= max_depth
         K = max_depth
     multiplier, rej = divmod(1 << K, m)
-    tree = gen_ky_tree([a * multiplier for a in arr] + [rej])
+    tree = gen_ky_tree([a * multiplier for a in arr] + [rej], profile=profile)
     # rewrite tree so that the rejection nodes point back to the root
-    for level in tree:
-        reject_count = sum(node == ('accept', n) for node in level)
-        assert reject_count <= 1
-        if reject_count:
-            level[:] = [('reject', 0)] * reject_count + [node for node in level if node != ('accept', n)]
+    with _phase(profile, 'reject_rewrite'):
+        for level in tree:
+            reject_count = sum(node == ('accept', n) for node in level)
+            assert reject_count <= 1
+            if reject_count:
+                level[:] = [('reject', 0)] * reject_count + [node for node in level if node != ('accept', n)]
     return tree
 
 
@@ -267,6 +504,52 @@ def toll_fldr(A):
     M = sum(A)
     return sum(a*trelfldr(a,M) for a in A) / M
 
+def sweep_aldr_depths(A, max_depth = None, min_depth = None):
+    # expected cost and size of ALDR[A, K] for each depth K from min_depth
+    # (the FLDR depth k by default) to max_depth (4k by default), as a list
+    # of tuples (K, expected bits, toll, number of leaves, bytes), where the
+    # bytes are those of the flattened tree (breadths and leaves) in c/aldr.c.
+    # c = 2^K // M and r = 2^K % M are updated from one depth to the next,
+    # and repeated weights share one evaluation of nu and popcount.
+    M = sum(A)
+    k = (M-1).bit_length()
+    min_depth = k if min_depth is None else min_depth
+    max_depth = 4*k if max_depth is None else max_depth
+    assert k <= min_depth <= max_depth
+    weights = collections.Counter(A)
+    # zero weights are valid outcomes that never occur
+    HA = H([a for a in A if a])
+    c, r = divmod(1 << min_depth, M)
+    sweep = []
+    for K in range(min_depth, max_depth+1):
+        pass_cost = nu(r, K) + sum(mult * nu(c*a, K) for a, mult in weights.items())
+        bits = pass_cost * ((1 << K) / (c * M))
+        num_leaves = r.bit_count() + sum(mult * (c*a).bit_count() for a, mult in weights.items())
+        num_bytes = 4 * (num_leaves + K + 1)
+        sweep.append((K, bits, bits - HA, num_leaves, num_bytes))
+        c, r = c << 1, r << 1
+        if r >= M:
+            c += 1
+            r -= M
+    return sweep
+
+def optimize_depth(A, weight_bits = 1, weight_bytes = 0, weight_levels = 0, max_toll = None, max_depth = None):
+    # the depth K of ALDR[A, K] minimizing the cost
+    #   weight_bits * (expected bits per sample)
+    #   + weight_bytes * (bytes of the flattened tree) + weight_levels * (K + 1),
+    # among depths with toll below max_toll (if given) up to max_depth (4k by default)
+    best = None
+    for K, bits, toll, num_leaves, num_bytes in sweep_aldr_depths(A, max_depth):
+        if max_toll is not None and toll >= max_toll:
+            continue
+        cost = weight_bits * bits + weight_bytes * num_bytes + weight_levels * (K + 1)
+        # prefer the shallower depth when costs agree up to rounding
+        if best is None or cost < best[0] - 1e-12:
+            best = (cost, K)
+    if best is None:
+        raise ValueError('no depth up to max_depth has toll below max_toll=%r' % (max_toll,))
+    return best[1]
+
 def get_all_tolls_uniform(m):
     # compute the toll of ALDR trees for all possible depths
     # for a uniform distribution with m outcomes
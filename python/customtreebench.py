@@ -0,0 +1,126 @@
+# Released under Apache 2.0; refer to LICENSE.txt
+
+# In-process benchmarks of the samplers in the Python library.
+#
+# Each method has a preprocessing function (weights -> sampler) and a
+# sampling function (sampler -> outcome), and is measured in the same way
+# as the READ_PREPROCESS_SAMPLE_TIME macro in c/macros.c, so that results
+# can be written in the columns of aldr-alias-performance-data.txt:
+#
+#   fname method preprocess_time_cold preprocess_time_warm sample_time flips num_bytes
+#
+# where num_bytes is the memory retained by the sampler (from tracemalloc).
+# Measurements without a counterpart in the C benchmark are returned
+# separately (see extra_columns).
+
+import gc
+import math
+import random
+import time
+import tracemalloc
+
+from customtree import *
+from alias import gen_alias_table
+from alias import get_alias_entropy
+from alias import sample_alias
+from alias import sample_alias_batch
+
+def gen_aldr_tree(arr):
+    # ALDR at depth K = 2k, as preprocess_aldr_flat in c/aldr.c
+    return gen_fldr_tree(arr, 2 * (sum(arr)-1).bit_length())
+
+# method name -> (preprocess, sample, expected entropy of the sampler);
+# a suffix ".osrng" on the method name draws the random bits from the
+# operating system, as in c/main.c
+methods = {
+    'aldr.python': (gen_aldr_tree, sample, get_tree_entropy),
+    'fldr.python': (gen_fldr_tree, sample, get_tree_entropy),
+    'ky.python': (gen_ky_tree, sample, get_tree_entropy),
+    'alias.python': (gen_alias_table, sample_alias, get_alias_entropy),
+}
+
+# method name -> batch sampling function (sampler, size -> samples, bits),
+# for the methods that have one
+batch_methods = {
+    'alias.python': sample_alias_batch,
+}
+
+extra_columns = (
+    'latency_p50',      # median time of a single call to sample (seconds)
+    'latency_p99',      # 99th percentile time of a single call to sample (seconds)
+    'batch_time',       # time per sample of one call to the batch sampler (seconds; nan if none)
+    'entropy_time',     # time to compute the expected entropy of the sampler (seconds)
+    'expected_flips',   # expected entropy of the sampler (bits)
+    'peak_bytes',       # peak memory allocated during preprocessing
+)
+
+def measure_memory(preprocess, arr):
+    # return the bytes retained by the sampler and the peak bytes allocated while building it
+    gc.collect()
+    tracemalloc.start()
+    table = preprocess(arr)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del table
+    return current, peak
+
+def benchmark_method(arr, method, num_samples = 100000, num_preprocess_warm = 10, num_latency = 10000,
+        seed = None):
+    # return the columns of aldr-alias-performance-data.txt (without fname and method)
+    # and a dict with the extra_columns; the bits are drawn from a Mersenne
+    # twister seeded with seed, unless the method uses the OS random source
+    osrng = method.endswith('.osrng')
+    preprocess, sample_fn, entropy_fn = methods[method.removesuffix('.osrng')]
+    batch_fn = batch_methods.get(method.removesuffix('.osrng'))
+    set_flip_source(True if osrng else random.Random(seed))
+
+    t = time.perf_counter()
+    table = preprocess(arr)
+    preprocess_time_cold = time.perf_counter() - t
+    t = time.perf_counter()
+    for _ in range(num_preprocess_warm):
+        del table
+        table = preprocess(arr)
+    preprocess_time_warm = (time.perf_counter() - t) / num_preprocess_warm
+
+    # throughput of repeated calls to sample and entropy consumption
+    reset_flips()
+    t = time.perf_counter()
+    for _ in range(num_samples):
+        sample_fn(table)
+    sample_time = (time.perf_counter() - t) / num_samples
+    flips = get_num_flips() / num_samples
+
+    # latency of single calls
+    timer = time.perf_counter_ns
+    latencies = []
+    for _ in range(num_latency):
+        t = timer()
+        sample_fn(table)
+        latencies.append(timer() - t)
+    latencies.sort()
+
+    # throughput of the batch sampler
+    batch_time = math.nan
+    if batch_fn is not None:
+        t = time.perf_counter()
+        batch_fn(table, num_samples)
+        batch_time = (time.perf_counter() - t) / num_samples
+
+    t = time.perf_counter()
+    expected_flips = entropy_fn(table)
+    entropy_time = time.perf_counter() - t
+
+    del table
+    num_bytes, peak_bytes = measure_memory(preprocess, arr)
+    set_flip_source(False)
+
+    extra = {
+        'latency_p50': latencies[len(latencies)//2] / 1e9,
+        'latency_p99': latencies[(len(latencies)*99)//100] / 1e9,
+        'batch_time': batch_time,
+        'entropy_time': entropy_time,
+        'expected_flips': expected_flips,
+        'peak_bytes': peak_bytes,
+    }
+    return (preprocess_time_cold, preprocess_time_warm, sample_time, flips, num_bytes), extra
@@ -0,0 +1,145 @@
+# Released under Apache 2.0; refer to LICENSE.txt
+
+# Instrumented sampling: the number of random bits consumed and the number
+# of restarts (back-edges taken) by each sample, collected into histograms.
+#
+# The samplers in customtree.py and alias.py are not modified, so sampling
+# without instrumentation costs nothing extra. The bit count of any sampler
+# that draws from flip() is obtained from the difference in get_num_flips();
+# restarts are counted by sample_counted, which walks a tree like sample.
+#
+#   tree = gen_fldr_tree(A, 2*k)
+#   stats = multisample_counted(tree, 10**6)
+#   entropy_report(stats, A, tree)
+
+import math
+
+from array import array
+
+from customtree import *
+
+class EntropyHistogram:
+    # histograms of bits per sample and restarts per sample, as arrays of
+    # counts indexed by the number of bits (restarts)
+
+    def __init__(self):
+        self.bits = array('Q')
+        self.restarts = array('Q')
+        self.count = 0
+        self.total_bits = 0
+        self.total_bits_sq = 0
+
+    def add(self, bits, restarts = 0):
+        for hist, x in ((self.bits, bits), (self.restarts, restarts)):
+            if x >= len(hist):
+                hist.extend([0] * (x + 1 - len(hist)))
+            hist[x] += 1
+        self.count += 1
+        self.total_bits += bits
+        self.total_bits_sq += bits * bits
+
+    def merge(self, other):
+        for name in ('bits', 'restarts'):
+            mine, theirs = getattr(self, name), getattr(other, name)
+            if len(theirs) > len(mine):
+                mine.extend([0] * (len(theirs) - len(mine)))
+            for x, c in enumerate(theirs):
+                mine[x] += c
+        self.count += other.count
+        self.total_bits += other.total_bits
+        self.total_bits_sq += other.total_bits_sq
+
+    def mean(self):
+        return self.total_bits / self.count
+
+    def variance(self):
+        return max(0, self.total_bits_sq / self.count - self.mean()**2) * self.count / max(1, self.count - 1)
+
+    def quantile(self, q):
+        # smallest b such that at least a fraction q of samples used at most b bits
+        target = q * self.count
+        seen = 0
+        for b, c in enumerate(self.bits):
+            seen += c
+            if seen >= target:
+                return b
+        return len(self.bits) - 1
+
+    def tail(self, b):
+        # fraction of samples that used more than b bits
+        return sum(self.bits[b+1:]) / self.count
+
+    def restart_rate(self):
+        # mean number of restarts per sample
+        return sum(r * c for r, c in enumerate(self.restarts)) / self.count
+
+def sample_counted(tree, stats):
+    # sample from a tree like sample, recording bits and restarts in stats
+    bits = get_num_flips()
+    restarts = 0
+    depth = 0
+    breadth = 0
+    while True:
+        level = tree[depth]
+        if breadth < len(level):
+            match level[breadth]:
+                case ('accept', a):
+                    stats.add(get_num_flips() - bits, restarts)
+                    return a
+                case ('reject', new_depth):
+                    restarts += 1
+                    depth = new_depth + 1
+                    breadth = breadth * 2 + flip()
+                    continue
+                case ('subtree', subtree):
+                    a = sample(subtree)
+                    stats.add(get_num_flips() - bits, restarts)
+                    return a
+        breadth = (breadth - len(level)) * 2 + flip()
+        depth += 1
+
+def multisample_counted(tree, n, stats = None):
+    # draw n samples from a tree and return the histograms of their costs
+    stats = EntropyHistogram() if stats is None else stats
+    for _ in range(n):
+        sample_counted(tree, stats)
+    return stats
+
+def multisample_counted_fn(sample_fn, table, n, stats = None):
+    # bits per sample of any sampler using flip() (restarts are not visible)
+    stats = EntropyHistogram() if stats is None else stats
+    for _ in range(n):
+        bits = get_num_flips()
+        sample_fn(table)
+        stats.add(get_num_flips() - bits)
+    return stats
+
+def entropy_report(stats, A, tree = None, expected = None, z = 1.959963984540054):
+    # compare the empirical bits per sample with the expected cost of the
+    # sampler (get_tree_entropy(tree), or expected) and with H(A);
+    # intervals are normal approximations at the given z-score (95% by default)
+    mean = stats.mean()
+    half_width = z * math.sqrt(stats.variance() / stats.count)
+    # zero weights are valid outcomes that never occur
+    HA = H([a for a in A if a])
+    if expected is None and tree is not None:
+        expected = get_tree_entropy(tree)
+    report = {
+        'samples': stats.count,
+        'mean_bits': mean,
+        'mean_bits_ci': (mean - half_width, mean + half_width),
+        'std_bits': math.sqrt(stats.variance()),
+        'median_bits': stats.quantile(0.5),
+        'p99_bits': stats.quantile(0.99),
+        'p999_bits': stats.quantile(0.999),
+        'max_bits': len(stats.bits) - 1,
+        'restarts_per_sample': stats.restart_rate(),
+        'H': HA,
+        'toll': mean - HA,
+        'toll_ci': (mean - half_width - HA, mean + half_width - HA),
+    }
+    if expected is not None:
+        report['expected_bits'] = expected
+        report['expected_toll'] = expected - HA
+        report['expected_in_ci'] = abs(mean - expected) <= half_width
+    return report
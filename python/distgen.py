@@ -0,0 +1,289 @@
+# Released under Apache 2.0; refer to LICENSE.txt
+
+# Deterministic generator for synthetic distributions in the `.dist` format
+# read by `c/main.out` and the rust `aldr` binary:
+#
+#   <M>
+#   <n> <a_1> ... <a_n>
+#   <H(A) to 5 decimal places>
+#
+# Files are named `<prefix>.<n>.<M>.<seed>.dist`, where the prefix is `d`
+# for the default `random` family (the naming of `distributions/`) and the
+# family name otherwise.
+#
+# The weights of the `random`, `zipf`, `dyadic` and `heavy` families are
+# produced in chunks of outcomes. Each chunk draws from its own random stream,
+# seeded by (seed, chunk index), so the output does not depend on the number
+# of worker processes, and no chunk ever needs the weights of another chunk.
+# A chunk first produces real-valued masses, and the weight sum M is then
+# split exactly as follows: every outcome receives 1, and the remaining
+# M - n units are split in proportion to the masses, i.e., outcome i receives
+# floor(q_i) for its share q_i, and the leftover units are dealt out by a
+# multinomial draw over the fractional parts (first across chunks, then
+# within each chunk). Each weight is therefore at least 1 + floor(q_i), but
+# the multinomial draw may deal one outcome several of the leftover units
+# (of which there are fewer than n), so it is not always within one unit
+# of its share.
+#
+# Example (the `distributions/` grid, but extended to larger n and M):
+#
+#   python distgen.py --family random --n 10 100 1000000 --M 1000000 2147483648 \
+#       --seed 418 --outdir ../distributions-large --processes 8
+
+import argparse
+import math
+import os
+
+from multiprocessing import Pool
+
+import numpy as np
+
+CHUNK_SIZE = 1 << 16
+
+def n_grid(n_max, per_decade = 30):
+    # the values of n used in `distributions/`: floor(10^(j/per_decade)), deduplicated
+    grid = []
+    j = 0
+    while (n := int(10**(j/per_decade))) <= n_max:
+        if n > 1 and (not grid or grid[-1] != n):
+            grid.append(n)
+        j += 1
+    return grid
+
+def dist_filename(prefix, n, M, seed):
+    return f'{prefix}.{n}.{M}.{seed}.dist'
+
+# ---------------------------------------------------------------------------
+# Mass families: real-valued masses for outcomes lo, ..., hi-1.
+
+def masses_random(rng, lo, hi, n, M, sigma = 3.0, **_):
+    # heavy-tailed log-normal masses, like the `distributions/` corpus
+    return rng.lognormal(0.0, sigma, hi - lo)
+
+def masses_zipf(rng, lo, hi, n, M, s = 1.0, **_):
+    # Zipf's law over outcomes in order, p_i proportional to 1/(i+1)^s
+    return np.arange(lo + 1, hi + 1, dtype=np.float64) ** -s
+
+def masses_dyadic(rng, lo, hi, n, M, depth = None, **_):
+    # probabilities proportional to 2^-e for random integers 0 <= e < depth,
+    # so that each weight is close to a dyadic fraction of the largest weight
+    # (the ALDR tree for an exactly dyadic distribution is free)
+    if depth is None:
+        depth = max(1, min(60, ((M // n).bit_length())))
+    return np.ldexp(1.0, -rng.integers(0, depth, hi - lo))
+
+def masses_heavy(rng, lo, hi, n, M, heavy = 0.5, **_):
+    # outcome 0 has probability about `heavy`, the others share the rest evenly
+    mass = np.ones(hi - lo)
+    if lo == 0:
+        mass[0] = (n - 1) * heavy / (1 - heavy) if n > 1 else 1.0
+    return mass
+
+mass_families = {
+    'random': masses_random,
+    'zipf': masses_zipf,
+    'dyadic': masses_dyadic,
+    'heavy': masses_heavy,
+}
+
+def _chunk_rng(seed, chunk):
+    return np.random.default_rng([seed, chunk])
+
+def _chunk_shares(family, n, M, seed, chunk, total, params):
+    lo = chunk * CHUNK_SIZE
+    hi = min(n, lo + CHUNK_SIZE)
+    rng = _chunk_rng(seed, chunk)
+    mass = mass_families[family](rng, lo, hi, n, M, **params)
+    q = mass * ((M - n) / total)
+    floor = np.floor(q)
+    return rng, floor.astype(np.int64), q - floor
+
+def _task_mass(task):
+    family, n, M, seed, chunk, params = task
+    lo = chunk * CHUNK_SIZE
+    hi = min(n, lo + CHUNK_SIZE)
+    return float(math.fsum(mass_families[family](_chunk_rng(seed, chunk), lo, hi, n, M, **params)))
+
+def _task_floor(task):
+    family, n, M, seed, chunk, total, params = task
+    _, floor, frac = _chunk_shares(family, n, M, seed, chunk, total, params)
+    return int(floor.sum()), float(math.fsum(frac))
+
+def _task_weights(task):
+    family, n, M, seed, chunk, total, extra, params = task
+    rng, floor, frac = _chunk_shares(family, n, M, seed, chunk, total, params)
+    weights = floor + 1
+    if extra:
+        weights += rng.multinomial(extra, frac / frac.sum())
+    return weights
+
+def split_exact(rng, count, masses):
+    # split the integer count over the masses by successive binomial draws
+    # (a multinomial draw that tolerates masses of wildly different scale)
+    remaining = math.fsum(masses)
+    result = []
+    for mass in masses:
+        if count == 0 or remaining <= 0:
+            result.append(0)
+            continue
+        x = int(rng.binomial(count, min(1.0, mass / remaining)))
+        result.append(x)
+        count -= x
+        remaining -= mass
+    assert count == 0
+    return result
+
+def iter_mass_family(pool, family, n, M, seed, params):
+    # yield the weights of a mass family as int64 arrays, one chunk at a time
+    assert 0 < n <= M
+    num_chunks = (n + CHUNK_SIZE - 1) // CHUNK_SIZE
+    tasks = [(family, n, M, seed, j, params) for j in range(num_chunks)]
+    total = math.fsum(pool.map(_task_mass, tasks))
+    tasks = [(family, n, M, seed, j, total, params) for j in range(num_chunks)]
+    floors, fracs = zip(*pool.map(_task_floor, tasks))
+    leftover = (M - n) - sum(floors)
+    # the leftover is below n; deal it out over chunks by their fractional parts
+    extras = split_exact(_chunk_rng(seed, num_chunks), leftover, fracs)
+    tasks = [(family, n, M, seed, j, total, extras[j], params) for j in range(num_chunks)]
+    yield from pool.imap(_task_weights, tasks)
+
+# ---------------------------------------------------------------------------
+# Exact families, whose weights are a deterministic function of the arguments.
+
+def iter_uniform(n, M):
+    # M/n in each outcome, the first M%n outcomes receive one extra unit
+    w, rem = divmod(M, n)
+    for lo in range(0, n, CHUNK_SIZE):
+        hi = min(n, lo + CHUNK_SIZE)
+        weights = np.full(hi - lo, w, dtype=np.int64)
+        weights[:max(0, min(hi, rem) - lo)] += 1
+        yield weights
+
+def worst_case_b(b):
+    # P proportional to [1, b-1, b, 2b, 4b, ..., 2^floor(log b) b] from figure 8,
+    # whose ALDR toll approaches 2 at depth 2k when b is an Artin prime
+    return [1, b-1] + [b << i for i in range(b.bit_length())]
+
+def dp_argmax_partition(m, K = None):
+    # the m-type distribution maximizing toll(ALDR[P, K]) (K = 2k by default),
+    # found by the array dynamic program of `dp-2-sufficiency-of-2k.py`
+    from customtree import H1, nu
+    k = (m-1).bit_length()
+    if K is None:
+        K = 2 * k
+    x = m >> ((m & -m).bit_length() - 1)
+    Hs = [H1(i/m) for i in range(m+1)]
+    p2K = 1 << K
+    c = p2K // m
+    R = p2K - c * m
+    B = p2K / (c * m)
+    dp = [0]*(m+1)
+    dp[0] = nu(R, K) * B
+    nus = [nu(i*c, K) for i in range(m+1)]
+    rev = [0]*(m+1)
+    for i in range(0, m, x):
+        for di in range(x, m-i, x):
+            nv = dp[i] + B*nus[di] - Hs[di]
+            if nv > dp[i+di]:
+                dp[i+di] = nv
+                rev[i+di] = di
+    for i in range(m):
+        for di in range(1, m-i+1):
+            if di % x:
+                nv = dp[i] + B*nus[di] - Hs[di]
+                if nv > dp[i+di]:
+                    dp[i+di] = nv
+                    rev[i+di] = di
+    arr = []
+    i = m
+    while i:
+        arr.append(rev[i])
+        i -= rev[i]
+    return sorted(arr, reverse=True)
+
+# ---------------------------------------------------------------------------
+
+def write_dist(path, n, M, chunks):
+    # stream weight chunks into a `.dist` file, computing H(A) on the way;
+    # the file is written under a temporary name and renamed when complete
+    tmp = f'{path}.tmp{os.getpid()}'
+    count = 0
+    total = 0
+    alog2a = []
+    with open(tmp, 'w') as fp:
+        fp.write(f'{M}\n{n}')
+        for weights in chunks:
+            assert weights.min() > 0
+            count += len(weights)
+            total += int(weights.sum())
+            alog2a.append(float(np.dot(weights, np.log2(weights))))
+            fp.write(' ')
+            fp.write(' '.join(map(str, weights.tolist())))
+        assert count == n and total == M
+        entropy = math.log2(M) - math.fsum(alog2a) / M
+        fp.write(f'\n{entropy:.5f}\n')
+    os.replace(tmp, path)
+    return path
+
+def generate(pool, family, n, M, seed, outdir, params = {}):
+    # generate one distribution and return the path of its `.dist` file
+    if family in mass_families:
+        prefix = 'd' if family == 'random' else family
+        chunks = iter_mass_family(pool, family, n, M, seed, params)
+    elif family == 'uniform':
+        prefix = family
+        chunks = iter_uniform(n, M)
+    else:
+        if family == 'worst':
+            arr = worst_case_b(n)
+        elif family == 'dp':
+            arr = dp_argmax_partition(n)
+        else:
+            raise ValueError(f'unknown family {family}')
+        prefix = f'{family}{n}'
+        n, M = len(arr), sum(arr)
+        chunks = [np.array(arr, dtype=np.int64)]
+    path = os.path.join(outdir, dist_filename(prefix, n, M, seed))
+    return write_dist(path, n, M, chunks)
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic .dist files.')
+    parser.add_argument('--family', default='random',
+        choices=[*mass_families, 'uniform', 'worst', 'dp'],
+        help='for `worst` and `dp`, each value of --n is b or m, and --M is ignored')
+    parser.add_argument('--n', type=int, nargs='+', required=True)
+    parser.add_argument('--M', type=int, nargs='+',
+        help='required except for `worst` and `dp`; values of n above M are skipped')
+    parser.add_argument('--n-grid', action='store_true',
+        help='use the grid of `distributions/` up to max(--n) instead of the listed values')
+    parser.add_argument('--seed', type=int, default=418)
+    parser.add_argument('--outdir', default='.')
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--sigma', type=float, help='random: log-normal shape')
+    parser.add_argument('--s', type=float, help='zipf: exponent')
+    parser.add_argument('--heavy', type=float, help='heavy: probability of outcome 0')
+    args = parser.parse_args()
+    if args.M is None:
+        if args.family not in ('worst', 'dp'):
+            parser.error(f'--M is required for --family {args.family}')
+        args.M = [0]
+
+    params = {key: getattr(args, key) for key in ('sigma', 's', 'heavy') if getattr(args, key) is not None}
+    ns = n_grid(max(args.n)) if args.n_grid else args.n
+    os.makedirs(args.outdir, exist_ok=True)
+    num_generated = 0
+    with Pool(args.processes) as pool:
+        for M in args.M:
+            for n in ns:
+                if args.family in ('worst', 'dp'):
+                    if M != args.M[0]:
+                        continue
+                elif n > M:
+                    continue
+                print(generate(pool, args.family, n, M, args.seed, args.outdir, params), flush=True)
+                num_generated += 1
+    if not num_generated:
+        parser.error('no distribution generated: every value of --n exceeds every value of --M')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+# Released under Apache 2.0; refer to LICENSE.txt
+
+# ALDR sampler with weight updates that do not rebuild the tree.
+#
+# The tree is stored as in preprocess_aldr_flat (c/aldr.c): level j holds
+# the leaves for bit K-j of the reject weight r = 2^K - c*M (label 0) and of
+# each amplified weight c*a_i (label i+1), in increasing order of label.
+# For fixed K and c, changing a_i to w only toggles the leaves of outcome i
+# at the levels where c*a_i and c*w differ, and toggles the reject leaves
+# where r changes, so update(i, w) costs one sorted insertion or deletion
+# per differing bit.
+#
+# Any amplification factor with c*M <= 2^K gives an exact sampler; the
+# choice c = 2^K // M only minimizes the reject weight. The tree is
+# therefore rebuilt (with a new K and c) only when c*M would exceed 2^K,
+# or when c has fallen below 2^K // ((1+headroom)^2 M), so that the
+# acceptance probability c*M/2^K stays above about 1/(1+headroom)^2.
+# A rebuild leaves a margin of headroom above M before the next overflow.
+# With headroom = 0, the tree is rebuilt exactly when 2^K // M changes.
+
+from array import array
+from bisect import bisect_left
+from bisect import insort
+
+from aldrflat import AldrFlat
+from customtree import flip
+from customtree import nu
+
+class DynamicAldr:
+
+    def __init__(self, arr, headroom = 1/64, kmul = 2):
+        self.weights = list(arr)
+        self.headroom = headroom
+        self.kmul = kmul
+        self.num_rebuilds = -1
+        self.rebuild()
+
+    def rebuild(self):
+        # build the tree from the current weights, at depth K = kmul * k
+        M = self.M = sum(self.weights)
+        assert M > 0
+        k = (M-1).bit_length()
+        K = self.K = self.kmul * max(k, 1)
+        c = self.c = (1 << K) // self.amplified_sum(M)
+        assert c > 0
+        r = self.r = (1 << K) - c * M
+        levels = self.levels = [[] for _ in range(K+1)]
+        for i, a in enumerate([r] + [c * a for a in self.weights]):
+            while a:
+                bit = a & -a
+                levels[K - bit.bit_length() + 1].append(i)
+                a ^= bit
+        self.num_rebuilds += 1
+
+    def amplified_sum(self, M):
+        # the sum that c is chosen for: M with some margin for growth
+        if not self.headroom:
+            return M
+        return int(M * (1 + self.headroom))
+
+    def needs_rebuild(self, M):
+        K, c = self.K, self.c
+        if c * M > (1 << K):
+            return True
+        if self.headroom:
+            return c < int((1 << K) / ((1 + self.headroom)**2 * M))
+        return c < (1 << K) // M
+
+    def toggle(self, label, old, new):
+        # move the leaves of label from the bits of old to the bits of new
+        levels = self.levels
+        K = self.K
+        diff = old ^ new
+        while diff:
+            bit = diff & -diff
+            level = levels[K - bit.bit_length() + 1]
+            if new & bit:
+                insort(level, label)
+            else:
+                del level[bisect_left(level, label)]
+            diff ^= bit
+
+    def update(self, i, w):
+        # set the weight of outcome i to w
+        assert w >= 0
+        M = self.M - self.weights[i] + w
+        if M == 0:
+            raise ValueError(f'weight {w} for outcome {i} would make every weight zero')
+        if self.needs_rebuild(M):
+            self.weights[i] = w
+            self.rebuild()
+            return
+        c = self.c
+        r = (1 << self.K) - c * M
+        self.toggle(i+1, c * self.weights[i], c * w)
+        self.toggle(0, self.r, r)
+        self.weights[i] = w
+        self.M = M
+        self.r = r
+
+    def sample(self):
+        # as sample_aldr_flat in c/aldr.c
+        levels = self.levels
+        while True:
+            depth = 0
+            val = 0
+            while True:
+                level = levels[depth]
+                if val < len(level):
+                    ans = level[val]
+                    if ans:
+                        return ans - 1
+                    break
+                val = ((val - len(level)) << 1) | flip()
+                depth += 1
+
+    def get_entropy(self):
+        # expected entropy consumption (in bits) of sample
+        K, c = self.K, self.c
+        pass_cost = nu(self.r, K) + sum(nu(c * a, K) for a in self.weights)
+        return pass_cost * (1 << K) / (c * self.M)
+
+    def flat(self):
+        # the tree as an AldrFlat of aldrflat.py
+        return AldrFlat(array('i', map(len, self.levels)),
+            array('i', [label for level in self.levels for label in level]))
+
+    def bytes(self):
+        # bytes of the flattened tree (breadths and leaves) in c/aldr.c
+        return 4 * (len(self.levels) + sum(map(len, self.levels)))
@@ -0,0 +1,20 @@
+# Released under Apache 2.0; refer to LICENSE.txt
+
+# The search over distributions [1, r] for the largest toll of ALDR[[1, r], 2k]
+# from experiment-amplification-worst-case-test.ipynb, using batchtoll.py.
+#
+# usage: python experiment-batch-toll.py [r_max]
+
+import sys
+import time
+
+from batchtoll import search_pairs
+
+r_max = int(float(sys.argv[1])) if len(sys.argv) > 1 else 100_000
+
+t = time.perf_counter()
+toll, cost, r = search_pairs(r_max)
+print(f"r_max={r_max}, maxtoll={toll}, cost={cost}, r={r}, time={time.perf_counter()-t:.2f}s")
+
+# r_max=100000, maxtoll=1.999861213973054, cost=2.0000417355951243, r=100000
+# r_max=10000000, maxtoll=1.9999978279585644, cost=2.0000002976679543, r=9999611
@@ -0,0 +1,73 @@
+# Released under Apache 2.0; refer to LICENSE.txt
+
+# Benchmark the C samplers in-process through the ctypes binding (caldr.py)
+# on the distributions in ../distributions, sweeping the depth multiplier
+# kmul of preprocess_aldr_flat_k and preprocess_aldr_enc_k (K = kmul * k),
+# and the lookup table sampler aldr.lut.
+# Writes the columns of aldr-alias-performance-data.txt, with methods named
+# aldr.flat.kmul<kmul> and aldr.enc.kmul<kmul>, to
+# aldr-ctypes-performance-data.txt. Depths above 62 are skipped.
+#
+# usage: python experiment-benchmark-ctypes.py [path.dist ...]
+
+import sys
+import time
+
+from glob import glob
+
+import numpy as np
+
+from caldr import CAldrEnc
+from caldr import CAldrFlat
+from caldr import CAldrLut
+from caldr import CAlias
+from caldr import CRecycle
+from caldr import MAX_DEPTH
+from caldr import get_num_flips
+from caldr import reset_flips
+from customtree import read_dist
+
+dirname = 'distributions'
+fnames = sys.argv[1:] or glob('../%s/*.dist' % (dirname,))
+
+data_file = "aldr-ctypes-performance-data.txt"
+kmuls = (1, 2, 3, 4)
+num_samples = 10**7
+num_preprocess_warm = 100
+
+def benchmark(preprocess, arr):
+    t = time.perf_counter()
+    sampler = preprocess(arr)
+    preprocess_time_cold = time.perf_counter() - t
+    t = time.perf_counter()
+    for _ in range(num_preprocess_warm):
+        sampler.close()
+        sampler = preprocess(arr)
+    preprocess_time_warm = (time.perf_counter() - t) / num_preprocess_warm
+    out = np.empty(num_samples, dtype=sampler.dtype)
+    reset_flips()
+    t = time.perf_counter()
+    sampler.sample(out)
+    sample_time = (time.perf_counter() - t) / num_samples
+    flips = get_num_flips() / num_samples
+    num_bytes = sampler.bytes()
+    sampler.close()
+    return preprocess_time_cold, preprocess_time_warm, sample_time, flips, num_bytes
+
+methods = [('alias.c', CAlias), ('recycle.c', CRecycle), ('aldr.lut', CAldrLut)]
+kmul_of = {'alias.c': 0, 'recycle.c': 0, 'aldr.lut': 2}
+for kmul in kmuls:
+    methods.append((f'aldr.flat.kmul{kmul}', lambda arr, kmul=kmul: CAldrFlat(arr, kmul)))
+    methods.append((f'aldr.enc.kmul{kmul}', lambda arr, kmul=kmul: CAldrEnc(arr, kmul)))
+    kmul_of[f'aldr.flat.kmul{kmul}'] = kmul_of[f'aldr.enc.kmul{kmul}'] = kmul
+
+data = []
+for method, preprocess in methods:
+    for fname in fnames:
+        arr = read_dist(fname)
+        if kmul_of[method] * (sum(arr)-1).bit_length() > MAX_DEPTH:
+            continue
+        row = (fname, method, *benchmark(preprocess, arr))
+        print(*row, flush=True)
+        data.append(row)
+np.savetxt(data_file, data, fmt='%s')
@@ -0,0 +1,48 @@
+# Released under Apache 2.0; refer to LICENSE.txt
+
+# Benchmark the Python library on the distributions in ../distributions,
+# in the columns of aldr-alias-performance-data.txt (see customtreebench.py),
+# so that the notebooks can plot Python next to C and rust.
+#
+# usage: python experiment-benchmark-python.py [path.dist ...]
+
+import sys
+
+from glob import glob
+
+import numpy as np
+
+from customtreebench import benchmark_method
+from customtreebench import extra_columns
+from customtree import read_dist
+
+seed = 418
+dirname = 'distributions'
+fnames = sys.argv[1:] or glob('../%s/*.dist' % (dirname,))
+
+data_file = "aldr-python-performance-data.txt"
+extra_data_file = "aldr-python-performance-extra-data.txt"
+methods, method_names = zip(
+    ("aldr.python", "ALDR (Python)"),
+    ("fldr.python", "FLDR (Python)"),
+    ("aldr.python.osrng", "ALDR (Python, OsRng)"),
+    ("alias.python", "Alias (Python)"),
+    ("alias.python.osrng", "Alias (Python, OsRng)"),
+)
+num_samples = 100000
+num_preprocess_warm = 10
+num_latency = 10000
+
+data = []
+extra_data = []
+for method in methods:
+    for fname in fnames:
+        arr = read_dist(fname)
+        (preproc_time_cold, preproc_time_warm, sample_time, flips, num_bytes), extra = \
+            benchmark_method(arr, method, num_samples, num_preprocess_warm, num_latency, seed)
+        data.append((fname, method, preproc_time_cold, preproc_time_warm, sample_time, flips, num_bytes))
+        extra_data.append((fname, method, *(extra[c] for c in extra_columns)))
+        print(*data[-1], flush=True)
+np.savetxt(data_file, data, fmt='%s')
+np.savetxt(extra_data_file, extra_data, fmt='%s',
+    header=' '.join(('fname', 'method', *extra_columns)))
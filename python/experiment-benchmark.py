@@ -1,6 +1,9 @@
 # Released under Apache 2.0; refer to LICENSE.txt
 
+import re
 import subprocess
+import sys
+import tempfile
 
 from glob import glob
 
@@ -18,28 +21,75 @@ methods, method_names = zip(
     ("fldr.enc.osrng", "FLDR (Enc, OsRng)"),
     ("aldr.flat", "ALDR (C)"),
     ("aldr.enc", "ALDR (Enc)"),
+    ("aldr.lut", "ALDR (C, LUT)"),
     ("fldr.flat", "FLDR (C)"),
     ("fldr.enc", "FLDR (Enc)"),
     ("alias.c", "Alias (C)"),
     ("alias.c.osrng", "Alias (C, OsRng)"),
+    ("recycle.c", "Recycling (C)"),
+    ("recycle.c.osrng", "Recycling (C, OsRng)"),
     ("alias.rust", "Alias (ThreadRng)"),
     ("alias.rust.osrng", "Alias (OsRng)"),
     ("aldr.rust", "ALDR (ThreadRng)"),
     ("aldr.rust.osrng", "ALDR (OsRng)"),
 )
+# sweep of the depth K of ALDR (see main.c), either as a multiple of
+# k = ceil(log2(M)) or fixed; depths outside [k, 62] are skipped
+kmuls = (3, 4)
+depths = (32, 48, 62)
+for kmul in kmuls:
+    methods += (f"aldr.flat.kmul{kmul}", f"aldr.enc.kmul{kmul}")
+    method_names += (f"ALDR (C, K = {kmul}k)", f"ALDR (Enc, K = {kmul}k)")
+for depth in depths:
+    methods += (f"aldr.flat.K{depth}", f"aldr.enc.K{depth}")
+    method_names += (f"ALDR (C, K = {depth})", f"ALDR (Enc, K = {depth})")
+# high-M tier: weight sums above 2^31, sampled only by the uint64
+# preprocessors of c/aldr.c; generate it with, e.g.,
+#   python distgen.py --n 10 100 1000 10000 100000 --M 1099511627776 \
+#       --outdir ../distributions-highM
+high_m_dirname = 'distributions-highM'
+high_m_fnames = glob('../%s/*.dist' % (high_m_dirname,))
+high_m_methods, high_m_method_names = zip(
+    ("aldr.flat.u64", "ALDR (C, 64-bit)"),
+    ("aldr.enc.u64", "ALDR (Enc, 64-bit)"),
+    ("aldr.flat.u64.osrng", "ALDR (C, 64-bit, OsRng)"),
+    ("aldr.enc.u64.osrng", "ALDR (Enc, 64-bit, OsRng)"),
+)
+
+# each binary runs all of its methods on all files in one process (its
+# --corpus mode), with num_samples_warmup untimed samples before timing
+num_samples_warmup = 10**6
+
+def run_corpus(command, methods, fnames):
+    # rows of the data file, as streamed by command; the runs that the
+    # command skips (with a message on stderr) are reported as warnings,
+    # and a failure of the command raises RuntimeError
+    # run the command only on CPU 0 (good with isolcpus=0)
+    args = ["taskset", "0x1", command, "--warmup", str(num_samples_warmup),
+            "--corpus", ",".join(methods), *fnames]
+    with tempfile.TemporaryFile(mode="w+") as stderr:
+        with subprocess.Popen(args, stdout=subprocess.PIPE, stderr=stderr, text=True) as s:
+            for line in s.stdout:
+                fname, method, preproc_time_cold, preproc_time_warm, sample_time, flips, num_bytes = line.split()
+                yield (fname, method, float(preproc_time_cold), float(preproc_time_warm),
+                       float(sample_time), float(flips), int(num_bytes))
+        stderr.seek(0)
+        messages = stderr.read().splitlines()
+    # the last line is the checksum of the samples
+    if messages and re.fullmatch(r"-?\d+c", messages[-1]):
+        messages.pop()
+    for message in messages:
+        print("warning: %s: %s" % (command, message), file=sys.stderr)
+    if s.returncode != 0:
+        raise RuntimeError("%s exited with status %d" % (command, s.returncode))
+
+rust_methods = [method for method in methods if method.split('.')[1] == "rust"]
+c_methods = [method for method in methods if method not in rust_methods]
 data=[]
-for method in methods:
-    for fname in fnames:
-        command = ["../rust/aldr/target/release/aldr", method, fname] \
-            if method.split('.')[1] == "rust" else \
-            ["../c/main.out", method, fname]
-        # run the command only on CPU 0 (good with isolcpus=0)
-        s=subprocess.run(["taskset","0x1",*command], capture_output=True)
-        _, preproc_time_cold, preproc_time_warm, sample_time, flips, num_bytes = s.stdout.decode().split()
-        preproc_time_cold = float(preproc_time_cold)
-        preproc_time_warm = float(preproc_time_warm)
-        sample_time = float(sample_time)
-        flips = float(flips)
-        num_bytes = int(num_bytes)
-        data.append((fname, method, preproc_time_cold, preproc_time_warm, sample_time, flips, num_bytes))
+for command, command_methods, command_fnames in (
+        ("../c/main.out", c_methods, fnames),
+        ("../rust/aldr/target/release/aldr", rust_methods, fnames),
+        ("../c/main.out", high_m_methods, high_m_fnames)):
+    if command_methods and command_fnames:
+        data.extend(run_corpus(command, command_methods, command_fnames))
 np.savetxt(data_file, data, fmt='%s')
@@ -0,0 +1,40 @@
+# Released under Apache 2.0; refer to LICENSE.txt
+
+# Bits per outcome of block sampling (blocksample.py) on the distributions in
+# ../distributions, for several memory budgets. For each file and budget,
+# prints the block size b, the bytes of the table for P^b, the entropy H of
+# the distribution, the expected bits per outcome of the single-roll ALDR
+# tree (get_tree_entropy), and the expected and measured bits per outcome of
+# the block sampler.
+#
+# usage: python experiment-block-sampling.py [path.dist ...]
+
+import sys
+
+from glob import glob
+
+from blocksample import BlockSampler
+from customtree import H
+from customtree import gen_fldr_tree
+from customtree import get_num_flips
+from customtree import get_tree_entropy
+from customtree import read_dist
+from customtree import reset_flips
+
+dirname = 'distributions'
+fnames = sys.argv[1:] or sorted(glob('../%s/*.dist' % (dirname,)))
+budgets = (1 << 16, 1 << 20, 1 << 24)
+num_outcomes = 10**5
+
+print('fname max_bytes b bytes H single block_expected block')
+for fname in fnames:
+    arr = read_dist(fname)
+    single = get_tree_entropy(gen_fldr_tree(arr, 2 * (sum(arr)-1).bit_length()))
+    for max_bytes in budgets:
+        sampler = BlockSampler(arr, max_bytes=max_bytes)
+        reset_flips()
+        for _ in range(-(-num_outcomes // sampler.t)):
+            sampler.sample()
+        bits = get_num_flips() / (-(-num_outcomes // sampler.t) * sampler.t)
+        print(fname, max_bytes, sampler.t, sampler.bytes(), H(arr), single,
+              sampler.entropy(), bits, flush=True)
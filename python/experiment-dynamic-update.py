@@ -0,0 +1,60 @@
+# Released under Apache 2.0; refer to LICENSE.txt
+
+# Compare the time of DynamicAldr.update against rebuilding the tree from
+# scratch, for random single-weight updates to random distributions, and
+# check that the patched trees equal trees built from the final weights:
+# with the default headroom, the tree for the same K and c; without
+# headroom (where c = 2^K // M is kept, so that almost every update is a
+# rebuild), preprocess_aldr_flat at the same K after num_exact_updates.
+
+import random
+import time
+
+from array import array
+
+from aldrflat import AldrFlat
+from aldrflat import aldr_flat_breadths
+from aldrflat import fill_aldr_flat_leaves
+from aldrflat import preprocess_aldr_flat
+from dynamicaldr import DynamicAldr
+
+seed = 418
+num_updates = 10000
+num_exact_updates = 100
+rng = random.Random(seed)
+
+def flat_tree(weights, K, c):
+    # the flattened tree of the amplified weights [2^K - c M, c a_1, ...]
+    amplified = [(1 << K) - c * sum(weights)] + [c * a for a in weights]
+    breadths = aldr_flat_breadths(amplified, K)
+    leaves_flat = array('i', bytes(4 * sum(breadths)))
+    fill_aldr_flat_leaves(amplified, K, breadths, leaves_flat)
+    return AldrFlat(breadths, leaves_flat)
+
+print('n M rebuild_time update_time speedup rebuilds bits_dynamic bits_fresh')
+for n in (10**3, 10**4, 10**5):
+    M = 10 * n
+    # heavy-tailed weights, as in distributions/
+    arr = [1 + int(rng.lognormvariate(0, 3) * 1e-3 * M / n) for _ in range(n)]
+
+    t = time.perf_counter()
+    for _ in range(5):
+        sampler = DynamicAldr(arr)
+    rebuild_time = (time.perf_counter() - t) / 5
+
+    updates = [(rng.randrange(n), rng.randint(1, 2 * (sum(arr) // n))) for _ in range(num_updates)]
+    t = time.perf_counter()
+    for i, w in updates:
+        sampler.update(i, w)
+    update_time = (time.perf_counter() - t) / num_updates
+    assert sampler.flat() == flat_tree(sampler.weights, sampler.K, sampler.c)
+
+    exact = DynamicAldr(arr, headroom=0)
+    for i, w in updates[:num_exact_updates]:
+        exact.update(i, w)
+    assert exact.flat() == preprocess_aldr_flat(exact.weights, exact.K)
+
+    fresh = DynamicAldr(sampler.weights)
+
+    print(n, sampler.M, rebuild_time, update_time, rebuild_time / update_time,
+          sampler.num_rebuilds, sampler.get_entropy(), fresh.get_entropy(), flush=True)
@@ -0,0 +1,69 @@
+# Released under Apache 2.0; refer to LICENSE.txt
+
+# Checks of the validator in goodnessoffit.py: correct samplers (the
+# flattened ALDR sampler and NumPy's exact choice) should pass at the rate
+# 1 - alpha, and wrong ones should be rejected, including when the stream
+# of samples ends before the first checkpoint (check_every). Then the
+# samples printed by the C and Rust binaries with --dump are piped into the
+# validator (for the binaries that are built).
+#
+# usage: python experiment-goodnessoffit.py
+
+import os
+import subprocess
+
+import numpy as np
+
+from aldrflat import preprocess_aldr_flat
+from aldrflat import sample_aldr_flat_batch
+from customtree import read_dist
+from goodnessoffit import batch_chunks
+from goodnessoffit import stream_chunks
+from goodnessoffit import validate
+
+arr = [1, 1, 2]
+wrong = [1, 1, 3]
+dist_path = '../distributions/d.1000.1000000.418.dist'
+num_dump = 10**7
+binaries = (
+    ('../c/main.out', ('aldr.flat', 'aldr.lut', 'recycle.c', 'alias.c')),
+    ('../rust/aldr/target/release/aldr', ('aldr.rust', 'alias.rust')),
+)
+rng = np.random.default_rng(418)
+f = preprocess_aldr_flat(arr)
+
+def choice(weights):
+    # a batch sampler of weights (up to floating point rounding)
+    p = np.array(weights) / sum(weights)
+    return lambda size: rng.choice(len(weights), size=size, p=p)
+
+def stream(weights, num_samples, chunk = 1 << 16):
+    # a finite stream of samples from weights
+    batch = choice(weights)
+    while num_samples > 0:
+        yield batch(min(chunk, num_samples))
+        num_samples -= chunk
+
+print('case samples rejected p_chi2 p_G')
+cases = [
+    ('aldr.flat', arr, batch_chunks(lambda size: sample_aldr_flat_batch(f, size, rng)[0])),
+    ('wrong', arr, batch_chunks(choice(wrong))),
+    ('short.correct', arr, stream(arr, 500000)),
+    ('short.wrong', arr, stream(wrong, 500000)),
+]
+for name, weights, chunks in cases:
+    rejected, num_samples, ((_, _, p_chi2), (_, _, p_G)) = validate(weights, chunks)
+    print(name, num_samples, int(rejected), p_chi2, p_G, flush=True)
+
+print('sampler path samples rejected p_chi2 p_G')
+for command, samplers in binaries:
+    if not os.path.exists(command):
+        print(f'# {command} is not built', flush=True)
+        continue
+    for sampler in samplers:
+        with subprocess.Popen([command, '--dump', str(num_dump), sampler, dist_path],
+                stdout=subprocess.PIPE) as proc:
+            rejected, num_samples, ((_, _, p_chi2), (_, _, p_G)) = validate(
+                read_dist(dist_path), stream_chunks(proc.stdout), max_samples=num_dump)
+            proc.kill()
+        print(sampler, dist_path, num_samples, int(rejected), p_chi2, p_G, flush=True)
@@ -0,0 +1,39 @@
+# Released under Apache 2.0; refer to LICENSE.txt
+
+# Size and expected entropy of grouped ALDR trees (aldrgrouped.py) against
+# flattened ALDR trees (aldrflat.py), on distributions with few distinct
+# weights: worst cases of bruteforce-max-toll.py, uniform weights, and n
+# outcomes with weights drawn from a small set, as well as the files given.
+#
+# usage: python experiment-grouped.py [path.dist ...]
+
+import random
+import sys
+
+from aldrflat import bytes_aldr_flat
+from aldrflat import get_aldr_flat_entropy
+from aldrflat import preprocess_aldr_flat
+from aldrgrouped import bytes_aldr_grouped
+from aldrgrouped import get_aldr_grouped_entropy
+from aldrgrouped import preprocess_aldr_grouped
+from customtree import H
+from customtree import read_dist
+
+random.seed(418)
+values = [1, 2, 3, 5, 8, 13, 21, 34, 55, 89]
+cases = [
+    ('[3]*15+[1]*3', [3]*15 + [1]*3),
+    ('[7]*1000', [7]*1000),
+    ('[7]*1000000', [7]*1000000),
+    ('10-values.10^4', [random.choice(values) for _ in range(10**4)]),
+    ('10-values.10^6', [random.choice(values) for _ in range(10**6)]),
+]
+cases += [(fname, read_dist(fname)) for fname in sys.argv[1:]]
+
+print('case n classes H flat_leaves flat_bytes flat_entropy grouped_leaves grouped_bytes grouped_entropy')
+for name, arr in cases:
+    f = preprocess_aldr_flat(arr)
+    g = preprocess_aldr_grouped(arr)
+    print(name, len(arr), len(g.weights), H([a for a in arr if a]),
+          len(f.leaves_flat), bytes_aldr_flat(f), get_aldr_flat_entropy(f),
+          len(g.flat.leaves_flat), bytes_aldr_grouped(g), get_aldr_grouped_entropy(g), flush=True)
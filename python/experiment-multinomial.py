@@ -0,0 +1,89 @@
+# Released under Apache 2.0; refer to LICENSE.txt
+
+# Validation and timing of the exact multinomial counts of multinomial.py.
+#
+# For small weights and N, every count vector is an outcome of the
+# multinomial distribution, with integer weight
+#   N! / (c_0! ... c_{n-1}!) * a_0^c_0 ... a_{n-1}^c_{n-1}
+# (out of M^N), so the count vectors drawn by multinomial_counts, and those
+# of multisample on the ALDR tree, are tested against these weights with the
+# chi-square and G tests of goodnessoffit.py, as are the draws of
+# binomial_half by rejection (m >= BINOMIAL_HALF_MIN) against the weights
+# C(m, k). Then both are timed for large N, multisample only up to
+# multisample_max_N; the time and bits of multinomial_counts grow with
+# about log^2 N rather than N.
+#
+# usage: python experiment-multinomial.py
+
+import itertools
+import math
+import time
+
+from customtree import gen_fldr_tree
+from customtree import get_num_flips
+from customtree import multisample
+from customtree import reset_flips
+from goodnessoffit import GoodnessOfFit
+from multinomial import BINOMIAL_HALF_MIN
+from multinomial import binomial_half
+from multinomial import multinomial_counts
+
+small_cases = [([3, 3, 3, 1], 4), ([1, 2], 10), ([5, 0, 2, 1, 1], 3), ([7] * 6, 3)]
+num_repetitions = 20000
+binomial_m = (BINOMIAL_HALF_MIN, 1001, 4000)
+binomial_repetitions = 100000
+large_N = (10**4, 10**5, 10**6, 10**7, 10**8, 10**9, 10**10)
+multisample_max_N = 10**6
+large_arr = list(range(1, 101))
+
+def count_vectors(n, N):
+    # all vectors of n non-negative integers summing to N
+    for cuts in itertools.combinations(range(N + n - 1), n - 1):
+        bounds = (-1,) + cuts + (N + n - 1,)
+        yield tuple(bounds[i+1] - bounds[i] - 1 for i in range(n))
+
+def multinomial_weight(arr, counts):
+    weight = math.factorial(sum(counts))
+    for a, c in zip(arr, counts):
+        weight = weight // math.factorial(c) * a**c
+    return weight
+
+def aldr_tree(arr):
+    return gen_fldr_tree(arr, 2 * (sum(arr)-1).bit_length())
+
+print('arr N method samples df chi2 p_chi2 G p_G')
+for arr, N in small_cases:
+    vectors = list(count_vectors(len(arr), N))
+    index = {v: j for j, v in enumerate(vectors)}
+    weights = [multinomial_weight(arr, v) for v in vectors]
+    tree = aldr_tree(arr)
+    samplers = {
+        'multinomial': lambda: multinomial_counts(arr, N),
+        'multisample': lambda: (lambda c: [c[i] for i in range(len(arr))])(multisample(tree, N)),
+    }
+    for method, draw in samplers.items():
+        gof = GoodnessOfFit(weights, min_expected=5)
+        gof.add([index[tuple(draw())] for _ in range(num_repetitions)])
+        (chi2, df, p_chi2), (G, _, p_G) = gof.tests()
+        print(arr, N, method, num_repetitions, df, chi2, p_chi2, G, p_G, flush=True)
+
+print('m method samples df chi2 p_chi2 G p_G')
+for m in binomial_m:
+    # C(m, k) rounded down to 62 bits, for the int64 weights of GoodnessOfFit
+    shift = max(0, m - 62)
+    gof = GoodnessOfFit([math.comb(m, k) >> shift for k in range(m + 1)], min_expected=5)
+    gof.add([binomial_half(m) for _ in range(binomial_repetitions)])
+    (chi2, df, p_chi2), (G, _, p_G) = gof.tests()
+    print(m, 'binomial_half', binomial_repetitions, df, chi2, p_chi2, G, p_G, flush=True)
+
+print('n N method time bits')
+tree = aldr_tree(large_arr)
+for N in large_N:
+    methods = [('multinomial', lambda: multinomial_counts(large_arr, N))]
+    if N <= multisample_max_N:
+        methods.append(('multisample', lambda: multisample(tree, N)))
+    for method, draw in methods:
+        reset_flips()
+        t = time.perf_counter()
+        draw()
+        print(len(large_arr), N, method, time.perf_counter() - t, get_num_flips(), flush=True)
@@ -0,0 +1,61 @@
+# Released under Apache 2.0; refer to LICENSE.txt
+
+# Profile the preprocessing of ALDR trees (gen_fldr_tree at depth 2k) on the
+# distributions in ../distributions, using the profile hooks of customtree.
+# Prints one line per distribution with the time in each phase, then the
+# totals over the corpus and, for each phase, the distributions that spend
+# the largest fraction of their time in it.
+#
+# usage: python experiment-profile-preprocess.py [path.dist ...]
+
+import os
+import sys
+import time
+
+from glob import glob
+
+from customtree import gen_fldr_tree
+from customtree import merge_profiles
+from customtree import new_profile
+from customtree import profile_phases
+from customtree import read_dist
+
+dirname = 'distributions'
+fnames = sys.argv[1:] or sorted(glob('../%s/*.dist' % (dirname,)))
+num_top = 5
+
+columns = list(new_profile())
+print('fname n M K time_total', *columns)
+
+total = new_profile()
+total_time = 0
+rows = []
+for fname in fnames:
+    arr = read_dist(fname)
+    K = 2 * (sum(arr)-1).bit_length()
+    profile = new_profile()
+    t = time.perf_counter()
+    gen_fldr_tree(arr, K, profile=profile)
+    elapsed = time.perf_counter() - t
+    merge_profiles(total, profile)
+    total_time += elapsed
+    rows.append((os.path.basename(fname), elapsed, profile))
+    print(os.path.basename(fname), len(arr), sum(arr), K, elapsed,
+          *(profile[c] for c in columns), flush=True)
+
+print()
+print('total', len(rows), 'distributions', total_time, 's')
+for phase in profile_phases:
+    key = 'time_' + phase
+    print('%-16s %10.6f s %6.2f%%' % (phase, total[key], 100 * total[key] / total_time))
+for key in columns:
+    if not key.startswith('time_'):
+        print('%-16s %d' % (key, total[key]))
+
+for phase in profile_phases:
+    key = 'time_' + phase
+    top = sorted(rows, key=lambda row: row[2][key] / row[1], reverse=True)[:num_top]
+    print()
+    print('largest fraction of time in', phase)
+    for fname, elapsed, profile in top:
+        print('  %-32s %6.2f%% of %.6f s' % (fname, 100 * profile[key] / elapsed, elapsed))
@@ -0,0 +1,50 @@
+# Released under Apache 2.0; refer to LICENSE.txt
+
+# Bits per sample of randomness recycling (recycle.py) against the flattened
+# ALDR sampler (aldrflat.py) on the distributions in ../distributions. For
+# each file, prints the entropy H of the distribution, the expected and
+# measured bits per sample of ALDR, and the measured bits per sample of
+# recycling, which carries its unused uniform state across samples.
+#
+# usage: python experiment-recycle.py [path.dist ...]
+
+import sys
+
+from glob import glob
+
+from aldrflat import get_aldr_flat_entropy
+from aldrflat import preprocess_aldr_flat
+from aldrflat import sample_aldr_flat
+from customtree import H
+from customtree import get_num_flips
+from customtree import read_dist
+from customtree import reset_flips
+from recycle import preprocess_recycle
+from recycle import reset_recycle
+from recycle import sample_recycle
+
+dirname = 'distributions'
+fnames = sys.argv[1:] or sorted(glob('../%s/*.dist' % (dirname,)))
+num_samples = 10**5
+
+def bits_per_sample(sample, tree):
+    reset_flips()
+    for _ in range(num_samples):
+        sample(tree)
+    return get_num_flips() / num_samples
+
+print('fname H aldr_expected aldr recycle')
+total_aldr = total_recycle = total_H = 0
+for fname in fnames:
+    arr = read_dist(fname)
+    f = preprocess_aldr_flat(arr)
+    reset_recycle()
+    bits_aldr = bits_per_sample(sample_aldr_flat, f)
+    bits_recycle = bits_per_sample(sample_recycle, preprocess_recycle(arr))
+    entropy = H(arr)
+    print(fname, entropy, get_aldr_flat_entropy(f), bits_aldr, bits_recycle, flush=True)
+    total_H += entropy
+    total_aldr += bits_aldr
+    total_recycle += bits_recycle
+print('mean toll: aldr %f recycle %f' % (
+    (total_aldr - total_H) / len(fnames), (total_recycle - total_H) / len(fnames)))
@@ -0,0 +1,60 @@
+# Released under Apache 2.0; refer to LICENSE.txt
+
+# Time building one shared ALDR arena (see aldrpool.py) for the distributions
+# in ../distributions with increasing numbers of processes, against
+# preprocessing them one at a time, then sample from every distribution in
+# worker processes that attach to the arena.
+#
+# usage: python experiment-shared-arena.py [path.dist ...]
+
+import os
+import sys
+import time
+
+from glob import glob
+from multiprocessing import Pool
+
+from aldrflat import preprocess_aldr_flat
+from aldrpool import AldrArena
+from aldrpool import build_arena
+from customtree import read_dist
+
+dirname = 'distributions'
+fnames = sys.argv[1:] or sorted(glob('../%s/*.dist' % (dirname,)))
+num_samples = 1000
+
+def sample_worker(task):
+    name, lo, hi = task
+    with AldrArena.attach(name) as arena:
+        t = time.perf_counter()
+        for j in range(lo, hi):
+            for _ in range(num_samples):
+                arena.sample(j)
+        return time.perf_counter() - t
+
+if __name__ == '__main__':
+    arrays = [read_dist(fname) for fname in fnames]
+
+    t = time.perf_counter()
+    for arr in arrays:
+        preprocess_aldr_flat(arr)
+    serial_time = time.perf_counter() - t
+    print('distributions', len(arrays))
+    print('serial preprocess', serial_time)
+
+    processes_grid = sorted({1, 2, 4, 8, os.cpu_count()})
+    for processes in processes_grid:
+        t = time.perf_counter()
+        arena = build_arena(arrays, processes=processes)
+        build_time = time.perf_counter() - t
+        print('processes', processes, 'build', build_time,
+              'speedup', serial_time / build_time, 'bytes', arena.bytes(), flush=True)
+        if processes != processes_grid[-1]:
+            arena.close()
+
+    step = -(-len(arena) // processes)
+    tasks = [(arena.name, lo, min(lo + step, len(arena))) for lo in range(0, len(arena), step)]
+    with Pool(processes) as pool:
+        times = pool.map(sample_worker, tasks)
+    print('sample time per draw', sum(times) / (len(arena) * num_samples))
+    arena.close()
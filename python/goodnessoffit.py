@@ -0,0 +1,188 @@
+# Released under Apache 2.0; refer to LICENSE.txt
+
+# Streaming goodness-of-fit tests of a sampler against the exact distribution
+# a_i / M of its weights.
+#
+# Samples are consumed in chunks (from a sampling function, or as
+# whitespace-separated integers on a stream such as the stdout of a sampler)
+# into an array of counts, so memory is O(n) regardless of the number of
+# samples. Every check_every samples, Pearson's chi-square statistic and the
+# G statistic (the likelihood ratio test) are computed, after pooling
+# consecutive outcomes until each pooled cell has expected count at least
+# min_expected, and compared with the chi-square distribution through the
+# regularized incomplete gamma function. (The G statistic, even with
+# Williams' correction, overstates the fit error when many cells have small
+# expected counts, hence the default min_expected = 50.) The test stops
+# early when a p-value falls below alpha / max_checks (a Bonferroni
+# correction for the repeated checks), and otherwise when max_samples
+# samples have been seen.
+#
+# usage: sampler ... | python goodnessoffit.py path.dist [--max-samples N]
+#            [--check-every N] [--alpha A]
+
+import argparse
+import math
+import sys
+
+import numpy as np
+
+from customtree import read_dist
+
+def gammaincc(a, x):
+    # regularized upper incomplete gamma function Q(a, x) = Gamma(a, x) / Gamma(a)
+    assert a > 0 and x >= 0
+    if x == 0:
+        return 1.0
+    log_prefix = a * math.log(x) - x - math.lgamma(a)
+    if x < a + 1:
+        # series for P(a, x)
+        term = total = 1 / a
+        ap = a
+        while abs(term) > abs(total) * 1e-16:
+            ap += 1
+            term *= x / ap
+            total += term
+        return max(0.0, 1 - total * math.exp(log_prefix))
+    # continued fraction for Q(a, x) (modified Lentz)
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    i = 0
+    while True:
+        i += 1
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-16:
+            return math.exp(log_prefix) * h
+
+def chi2_sf(statistic, df):
+    # P(X > statistic) for X with the chi-square distribution with df degrees of freedom
+    return gammaincc(df / 2, statistic / 2)
+
+class GoodnessOfFit:
+
+    def __init__(self, arr, min_expected = 50):
+        self.weights = np.asarray(arr, dtype=np.int64)
+        self.M = int(sum(arr))
+        self.probabilities = self.weights / self.M
+        self.counts = np.zeros(len(arr), dtype=np.int64)
+        self.num_samples = 0
+        self.min_expected = min_expected
+        self.impossible = 0
+
+    def add(self, samples):
+        # count a chunk of samples (an integer array)
+        samples = np.asarray(samples, dtype=np.int64)
+        if samples.size and (samples.min() < 0 or samples.max() >= len(self.counts)):
+            raise ValueError('sample out of range')
+        self.counts += np.bincount(samples, minlength=len(self.counts))
+        self.num_samples += samples.size
+
+    def pooled(self):
+        # observed and expected counts, pooled into consecutive cells with
+        # expected count at least min_expected (outcomes of weight 0 excluded)
+        support = self.weights > 0
+        self.impossible = int(self.counts[~support].sum())
+        observed = self.counts[support]
+        expected = self.num_samples * self.probabilities[support]
+        # cell j holds the outcomes whose cumulative expected count (before
+        # them) lies in [j min_expected, (j+1) min_expected)
+        before = np.cumsum(expected) - expected
+        cell = np.minimum(before // self.min_expected,
+                          max(self.num_samples // self.min_expected - 1, 0)).astype(np.int64)
+        starts = np.flatnonzero(np.diff(cell, prepend=-1))
+        return np.add.reduceat(observed, starts), np.add.reduceat(expected, starts)
+
+    def tests(self):
+        # ((chi2, df, p), (G, df, p)) for the samples so far
+        observed, expected = self.pooled()
+        df = len(observed) - 1
+        if self.impossible:
+            return (math.inf, df, 0.0), (math.inf, df, 0.0)
+        if df < 1:
+            return (0.0, 0, 1.0), (0.0, 0, 1.0)
+        chi2 = float(np.sum((observed - expected)**2 / expected))
+        positive = observed > 0
+        G = 2 * float(np.sum(observed[positive] * np.log(observed[positive] / expected[positive])))
+        # Williams' correction for the bias of G with many small cells
+        G /= 1 + (df + 2) / (6 * self.num_samples)
+        return (chi2, df, chi2_sf(chi2, df)), (G, df, chi2_sf(G, df))
+
+def run_tests(gof, chunks, max_samples, check_every, alpha):
+    # feed chunks into gof until a test rejects at level alpha / max_checks
+    # or max_samples samples are seen (or the chunks run out, in which case
+    # the samples since the last check are tested as well); returns
+    # (rejected, tests)
+    max_checks = max(1, -(-max_samples // check_every))
+    next_check = check_every
+    checked = None
+    for chunk in chunks:
+        gof.add(chunk[:max_samples - gof.num_samples])
+        if gof.num_samples >= next_check or gof.num_samples >= max_samples:
+            tests = gof.tests()
+            checked = gof.num_samples
+            next_check = gof.num_samples + check_every
+            if min(tests[0][2], tests[1][2]) < alpha / max_checks:
+                return True, tests
+        if gof.num_samples >= max_samples:
+            break
+    if checked != gof.num_samples:
+        tests = gof.tests()
+        if min(tests[0][2], tests[1][2]) < alpha / max_checks:
+            return True, tests
+    return False, tests
+
+def sample_chunks(sample_fn, chunk = 1 << 16):
+    # chunks of samples from a function of no arguments, e.g., lambda: sample(tree)
+    while True:
+        yield np.fromiter((sample_fn() for _ in range(chunk)), dtype=np.int64, count=chunk)
+
+def batch_chunks(batch_fn, chunk = 1 << 16):
+    # chunks of samples from a function size -> samples, e.g., a batch sampler
+    while True:
+        yield np.asarray(batch_fn(chunk), dtype=np.int64)
+
+def stream_chunks(fp, chunk_bytes = 1 << 20):
+    # chunks of the whitespace-separated integers in a binary stream
+    rest = b''
+    while True:
+        block = fp.read(chunk_bytes)
+        if not block:
+            if rest.strip():
+                yield np.array(rest.split(), dtype=np.int64)
+            return
+        block = rest + block
+        # keep a trailing partial number for the next block
+        cut = max(block.rfind(b' '), block.rfind(b'\n'), block.rfind(b'\t'))
+        rest = block[cut+1:]
+        if cut >= 0:
+            yield np.array(block[:cut].split(), dtype=np.int64)
+
+def validate(arr, chunks, max_samples = 10**7, check_every = 10**6, alpha = 1e-6, min_expected = 50):
+    gof = GoodnessOfFit(arr, min_expected)
+    rejected, tests = run_tests(gof, chunks, max_samples, check_every, alpha)
+    return rejected, gof.num_samples, tests
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path', help='.dist file with the weights of the sampler')
+    parser.add_argument('--max-samples', type=float, default=1e7)
+    parser.add_argument('--check-every', type=float, default=1e6)
+    parser.add_argument('--alpha', type=float, default=1e-6)
+    parser.add_argument('--min-expected', type=float, default=50)
+    args = parser.parse_args()
+    rejected, num_samples, ((chi2, df, p_chi2), (G, _, p_G)) = validate(
+        read_dist(args.path), stream_chunks(sys.stdin.buffer),
+        int(args.max_samples), int(args.check_every), args.alpha, args.min_expected)
+    print('samples df chi2 p_chi2 G p_G rejected')
+    print(num_samples, df, chi2, p_chi2, G, p_G, int(rejected))
+    sys.exit(1 if rejected else 0)
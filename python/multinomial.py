@@ -0,0 +1,154 @@
+# Released under Apache 2.0; refer to LICENSE.txt
+
+# Exact multinomial counts: the histogram of N i.i.d. samples from the
+# weights arr, without drawing the samples one at a time.
+#
+# The outcomes are split recursively into two halves of (about) equal size,
+# with weights A_L and A_R; the number of the N samples that fall in the left
+# half is Binomial(N, A_L / (A_L + A_R)), and the two halves are then split
+# with their own counts, so n - 1 binomial draws give the counts of all n
+# outcomes.
+#
+# Binomial(N, p) with rational p is exact from fair bits: a trial succeeds
+# if its uniform U in [0, 1) is below p, which is decided at the first
+# binary digit where U and p differ. At each digit of p, each of the m
+# undecided trials has that digit of U differ from it with probability 1/2,
+# so Binomial(m, 1/2) of them are decided (successes if the digit of p is 1)
+# and the rest continue to the next digit; the undecided count halves at
+# every digit, so about log2(N) digits are used.
+#
+# Binomial(m, 1/2) is drawn by rejection (as the number of set bits among m
+# random bits for m < BINOMIAL_HALF_MIN). For m = 2n, the ratio
+#   r(k) = C(2n, n+k) / C(2n, n) = prod_{i=1}^{|k|} (n-i+1) / (n+i)
+# is at most exp(-k^2 / 2n), so with w = ceil(sqrt(n)) a proposal
+# k = +-(j w + u), with j geometric (P(j) = 2^-(j+1)) and u uniform in
+# [0, w), has r(k) <= 2^(1-j) and is accepted with probability r(k) 2^(j-1)
+# (-0 is rejected); n + k is then accepted with probability proportional to
+# C(2n, n+k), and a proposal is accepted with probability about 0.22. The
+# acceptance test compares the bits of a uniform, drawn lazily, with an
+# approximation of r(k) 2^(j-1) from Stirling's series and a bound on its
+# error; only when the uniform is within the error of it is r(k) computed
+# exactly (with math.perm). A draw thus costs O(log m) expected bits and
+# operations, a split O(log^2 N), and the counts O(n log^2 N) in total (as
+# opposed to N tree walks for multisample).
+
+import collections
+import math
+
+from customtree import bernoulli
+from customtree import flip
+from customtree import flip_n
+from customtree import uniform
+
+BINOMIAL_HALF_MIN = 256
+
+def binomial_half_popcount(m):
+    # Binomial(m, 1/2), as the number of set bits among m random bits
+    x = 0
+    while m >= 32:
+        x += flip_n(32).bit_count()
+        m -= 32
+    return x + flip_n(m).bit_count() if m else x
+
+def log_ratio_bounds(n, k, j):
+    # bounds on ln(r(k) 2^(j-1)) for 0 <= k < n, from Stirling's series
+    #   ln (x!) = (x+1/2) ln x - x + ln(2 pi)/2 + 1/(12x) - theta/(360 x^3)
+    # with 0 < theta < 1, and a bound on the floating point rounding errors;
+    # ln r(k) = -n s - ln(1 - x^2)/2 + c with x = k/n and
+    #   s = (1+x) ln(1+x) + (1-x) ln(1-x) = sum_{i>=1} x^(2i) / (i (2i-1)),
+    # whose terms are summed for x <= 1/2 so that there is no cancellation
+    x = k / n
+    y = x * x
+    if x <= 0.5:
+        s, term, i = 0.0, y, 1
+        while term > 2**-60 * s:
+            s += term / (i * (2*i - 1))
+            term *= y
+            i += 1
+    else:
+        s = (1 + x) * math.log1p(x) + (1 - x) * math.log1p(-x)
+    c = (2 / n - 1 / (n + k) - 1 / (n - k)) / 12
+    log_t = c - n * s - 0.5 * math.log1p(-y) + (j - 1) * math.log(2)
+    error = 2**-46 * (n * s + j + 1) + 1 / (120 * (n - k)**3)
+    return log_t - error, log_t + error
+
+def accept_ratio(n, k, j):
+    # 1 with probability r(k) 2^(j-1)
+    t_lo, t_hi = 0.0, 1.0
+    if k < n - 16:
+        log_lo, log_hi = log_ratio_bounds(n, k, j)
+        t_lo = math.exp(log_lo) * (1 - 2**-50)
+        t_hi = max(math.exp(min(log_hi, 0.0)) * (1 + 2**-50), math.ulp(0.0))
+    # uniform U in [prefix, prefix + 1) / 2^num_bits, 8 bits at a time
+    prefix = 0
+    for num_bits in range(8, 72, 8):
+        prefix = (prefix << 8) | flip_n(8)
+        if (prefix + 1) / 2**num_bits <= t_lo:
+            return 1
+        if prefix / 2**num_bits >= t_hi:
+            return 0
+    # U = (prefix + V) / 2^64 < numer / denom iff V < 2^64 numer / denom - prefix
+    numer = math.perm(n, k) << (64 + j)
+    denom = math.perm(n + k, k) << 1
+    numer -= prefix * denom
+    if numer <= 0:
+        return 0
+    if numer >= denom:
+        return 1
+    return bernoulli(numer, denom)
+
+def binomial_half(m):
+    # Binomial(m, 1/2)
+    if m < BINOMIAL_HALF_MIN:
+        return binomial_half_popcount(m)
+    x = flip() if m & 1 else 0
+    n = m >> 1
+    w = math.isqrt(n - 1) + 1
+    while True:
+        j = 0
+        while not flip():
+            j += 1
+        negative = flip()
+        k = j * w + uniform(w)
+        if k > n or (negative and k == 0):
+            continue
+        if accept_ratio(n, k, j):
+            return x + n - k if negative else x + n + k
+
+def binomial(N, numer, denom):
+    # Binomial(N, numer/denom), expanding numer/denom in binary
+    assert 0 <= numer <= denom and denom > 0
+    if numer == denom:
+        return N
+    successes = 0
+    while N and numer:
+        numer <<= 1
+        decided = binomial_half(N)
+        if numer >= denom:
+            numer -= denom
+            successes += decided
+        N -= decided
+    return successes
+
+def multinomial_counts(arr, N):
+    # counts[i] of outcome i among N i.i.d. samples from arr
+    counts = [0] * len(arr)
+    prefix = [0]
+    for a in arr:
+        prefix.append(prefix[-1] + a)
+    assert prefix[-1] > 0
+    stack = [(0, len(arr), N)]
+    while stack:
+        lo, hi, count = stack.pop()
+        if hi - lo == 1:
+            counts[lo] = count
+            continue
+        mid = (lo + hi) // 2
+        left = binomial(count, prefix[mid] - prefix[lo], prefix[hi] - prefix[lo]) if count else 0
+        stack.append((lo, mid, left))
+        stack.append((mid, hi, count - left))
+    return counts
+
+def multinomial_counter(arr, N):
+    # multinomial_counts as a Counter of the outcomes drawn, like multisample
+    return collections.Counter({i: c for i, c in enumerate(multinomial_counts(arr, N)) if c})
@@ -0,0 +1,63 @@
+# Released under Apache 2.0; refer to LICENSE.txt
+
+# Exact sampling with randomness recycling, as in c/recycle.c.
+#
+# ALDR discards the state of its walk at every accepting leaf. Here a sample
+# is instead read off a uniform state (v, r), with v uniform in [0, r): with
+# q = r // M, if v < q*M then u = v % M lies in the interval
+# [cumulative[i], cumulative[i+1]) of exactly one outcome i (found by
+# bisection), and given i the pair (v // M, u - cumulative[i]) is uniform
+# over [0, q) x [0, a_i) and independent of all previous samples, so it is
+# kept as the state (v // M * a_i + u - cumulative[i], q * a_i) for the next
+# sample. Otherwise v - q*M is uniform in [0, r - q*M) and the draw is
+# repeated on it. Random bits (from flip_n in customtree.py) are only
+# consumed to extend the state back to RECYCLE_BITS bits, so none are
+# discarded and get_num_flips() / num_samples tends to H(a).
+#
+# The state is shared by all recycling samplers, like the bit buffer of
+# flip; reset_recycle discards it.
+
+from array import array
+from bisect import bisect_right
+
+from customtree import flip_n
+
+RECYCLE_BITS = 62
+
+recycle_value = 0
+recycle_range = 1
+
+def reset_recycle():
+    global recycle_value, recycle_range
+    recycle_value = 0
+    recycle_range = 1
+
+def preprocess_recycle(arr):
+    # cumulative weights: cumulative[i] = a_0 + ... + a_{i-1}, for i <= n
+    cumulative = array('q', [0])
+    for a in arr:
+        cumulative.append(cumulative[-1] + a)
+    assert cumulative[-1] > 0
+    return cumulative
+
+def sample_recycle(cumulative):
+    global recycle_value, recycle_range
+    M = cumulative[-1]
+    while True:
+        if not recycle_range >> RECYCLE_BITS:
+            num_bits = RECYCLE_BITS + 1 - recycle_range.bit_length()
+            recycle_value = (recycle_value << num_bits) | flip_n(num_bits)
+            recycle_range <<= num_bits
+        q = recycle_range // M
+        if recycle_value < q * M:
+            w, u = divmod(recycle_value, M)
+            i = bisect_right(cumulative, u) - 1
+            start = cumulative[i]
+            recycle_value = w * (cumulative[i+1] - start) + u - start
+            recycle_range = q * (cumulative[i+1] - start)
+            return i
+        recycle_value -= q * M
+        recycle_range -= q * M
+
+def bytes_recycle(cumulative):
+    return cumulative.itemsize * len(cumulative)
@@ -0,0 +1,109 @@
+# Released under Apache 2.0; refer to LICENSE.txt
+
+# Tolls of ALDR trees for the uniform distributions [1]*m, for all odd m in a
+# range at once, stored in a memory-mapped table for instant lookup.
+#
+# For each odd m with k = m.bit_length(), the table holds the FLDR toll
+# (depth k), the ALDR toll at depth 2k, and the first depth K in [k, 2k] at
+# which the toll of ALDR[[1]*m, K] is below two. As in get_all_tolls_uniform,
+# w = 2^K // m and rem = 2^K % m are advanced one depth at a time, here as
+# arrays over a chunk of m; the cost at depth K is
+#   (nu(rem, K) + m nu(w, K)) 2^K / (w m).
+#
+# The table is a .npy file with one row per odd m < m_max (row i is m = 2i+1),
+# filled in chunks by a process pool; a rerun only fills unfinished chunks.
+#
+# usage: python uniformtolls.py path m_max [processes]
+
+import os
+import sys
+
+from multiprocessing import Pool
+
+import numpy as np
+
+from batchtoll import nu_low
+
+table_dtype = np.dtype([
+    ('fldr_toll', '<f8'),
+    ('aldr_toll', '<f8'),
+    ('depth_below_2', 'u1'),   # 0 for rows not yet computed
+])
+
+def uniform_tolls_chunk(m):
+    # FLDR toll, ALDR toll at 2k, and first depth with toll < 2, for an array of odd m >= 3
+    m = np.asarray(m, dtype=np.int64)
+    assert (m & 1).all() and (m >= 3).all() and (m < (1 << 32)).all()
+    k = np.frexp(m.astype(np.float64))[1].astype(np.int64)   # m.bit_length()
+    log2m = np.log2(m)
+    mf = m.astype(np.float64)
+    # depth K = k: w = 1, rem = 2^k - m
+    K = k.copy()
+    w = np.ones_like(m, dtype=np.uint64)
+    rem = (np.int64(1) << k) - m
+    nuw = np.ldexp(k.astype(np.float64), -k)
+    fldr_toll = None
+    depth_below_2 = np.zeros(m.shape, dtype=np.uint8)
+    for step in range(int(k.max()) + 1):
+        active = step <= k
+        toll = (nu_low(rem, K) + mf * nuw) * np.ldexp(1.0, K) / (w.astype(np.float64) * mf) - log2m
+        if fldr_toll is None:
+            fldr_toll = toll
+        aldr_toll = np.where(active, toll, aldr_toll) if step else toll
+        first = active & (depth_below_2 == 0) & (toll < 2)
+        depth_below_2[first] = K[first]
+        # advance to depth K+1
+        rem <<= 1
+        w <<= np.uint64(1)
+        carry = rem >= m
+        rem[carry] -= m[carry]
+        w[carry] += np.uint64(1)
+        K += 1
+        nuw[carry] += np.ldexp(K[carry].astype(np.float64), -K[carry])
+    return fldr_toll, aldr_toll, depth_below_2
+
+def _fill_chunk(task):
+    path, lo, hi = task
+    table = np.load(path, mmap_mode='r+')
+    if table['depth_below_2'][hi-1]:
+        return lo, hi, False
+    m = 2 * np.arange(lo, hi, dtype=np.int64) + 1
+    rows = table[lo:hi]
+    if lo == 0:
+        # m = 1 needs no random bits
+        rows[0] = (0.0, 0.0, 0)
+        m = m[1:]
+        rows = rows[1:]
+    if len(m):
+        fldr_toll, aldr_toll, depth_below_2 = uniform_tolls_chunk(m)
+        rows['fldr_toll'] = fldr_toll
+        rows['aldr_toll'] = aldr_toll
+        rows['depth_below_2'] = depth_below_2
+    table.flush()
+    return lo, hi, True
+
+def build_table(path, m_max, chunk = 1 << 20, processes = None):
+    # compute (or finish computing) the table for all odd m < m_max
+    num_rows = m_max // 2
+    if not os.path.exists(path):
+        np.lib.format.open_memmap(path, mode='w+', dtype=table_dtype, shape=(num_rows,)).flush()
+    table = load_table(path)
+    assert len(table) == num_rows
+    tasks = [(path, lo, min(lo + chunk, num_rows)) for lo in range(0, num_rows, chunk)]
+    with Pool(processes) as pool:
+        for lo, hi, computed in pool.imap_unordered(_fill_chunk, tasks):
+            if computed:
+                print(f'm in [{2*lo+1}, {2*hi-1}] complete', flush=True)
+
+def load_table(path):
+    return np.load(path, mmap_mode='r')
+
+def lookup_uniform_toll(table, m):
+    # (FLDR toll, ALDR toll at 2k, first depth with toll < 2) for odd m
+    assert m & 1
+    fldr_toll, aldr_toll, depth_below_2 = table[m >> 1]
+    return float(fldr_toll), float(aldr_toll), int(depth_below_2)
+
+if __name__ == '__main__':
+    build_table(sys.argv[1], int(float(sys.argv[2])),
+        processes=int(sys.argv[3]) if len(sys.argv) > 3 else None)
@@ -13,8 +13,9 @@ use rand::rng;
 use rand_core::{TryRngCore, OsRng};
 use rand::RngCore;
 use std::env;
+use std::fs;
 use std::fs::File;
-use std::io::{BufRead};
+use std::io::{BufRead, BufWriter, Write};
 use std::time::Instant;
 use std::mem;
 
@@ -154,43 +155,62 @@ impl RngCore for WrappedOsRng {
     }
 }
 
-fn main() {
-    // Get the file path from the command line arguments
-    let args: Vec<String> = env::args().collect();
-    if args.len() < 3 {
-        eprintln!("Usage: {} <sampler> <file-path>", args[0]);
-        std::process::exit(1);
-    }
-
-    let path = &args[2];
+// measurements of one sampler on one distribution
+struct Bench {
+    sample_accumulator: u64,
+    build_duration_cold: f64,
+    build_duration_warm: f64,
+    sample_duration: f64,
+    entropy_consumed: f64,
+    sampler_bytes: usize,
+}
 
-    // Open the file
-    let file = File::open(path).expect("Failed to open the file.");
+fn read_weights(path: &str) -> Result<Vec<u32>, String> {
+    let file = File::open(path).map_err(|e| format!("{}: {}", path, e))?;
     let reader = std::io::BufReader::new(file);
 
     // Read the second line (skip the first line)
     let mut lines = reader.lines();
     lines.next(); // Skip the first line
     let second_line = lines.next()
-        .expect("No second line found")
-        .expect("Failed to read second line");
+        .ok_or(format!("{}: no second line found", path))?
+        .map_err(|e| format!("{}: {}", path, e))?;
 
     // Parse the second line: length and weights
-    let parts: Vec<&str> = second_line.trim().split_whitespace().collect();
-    let n: usize = parts[0].parse().unwrap();  // First element is the length
-    let weights: Vec<u32> = parts[1..]
-        .iter()
-        .map(|&s| s.parse().unwrap())
-        .collect();
-    let mut weights_clone = weights.clone();
+    let weights: Vec<u32> = second_line.trim().split_whitespace().skip(1)
+        .map(|s| s.parse().map_err(|e| format!("{}: {}", path, e)))
+        .collect::<Result<_, _>>()?;
+    // preprocess_aldr_flat computes 2^(2k) in a u64
+    if weights.iter().map(|&w| w as u64).sum::<u64>() > 1u64 << 31 {
+        return Err(format!("{}: weight sum too large", path));
+    }
+    Ok(weights)
+}
+
+// print dump_count samples, one per line
+fn dump(dump_count: u64, mut sample: impl FnMut() -> u64) {
+    let mut out = BufWriter::new(std::io::stdout().lock());
+    for _ in 0..dump_count {
+        if writeln!(out, "{}", sample()).is_err() {
+            // the reader has stopped reading
+            return;
+        }
+    }
+    let _ = out.flush();
+}
 
-    if args[1] == "aldr.rust.osrng" || args[1] == "aldr.rust" {
+fn bench(sampler: &str, weights: Vec<u32>, sample_count: u64, preprocess_count: u64,
+         warmup_count: u64, dump_count: u64) -> Result<Bench, String> {
+    let n = weights.len();
+    let mut weights_clone = weights.clone();
+    if sampler == "aldr.rust.osrng" || sampler == "aldr.rust" {
         let mut rng : Box<dyn RngCore> =
-            if args[1] == "aldr.rust.osrng" {
+            if sampler == "aldr.rust.osrng" {
                 Box::new(WrappedOsRng::new())
             } else {
                 Box::new(rng())
             };
+
         // Measure the time to create the distribution (sampler)
         let start_build_time_cold = Instant::now();
         let mut dist = preprocess_aldr_flat(weights);
@@ -202,7 +222,6 @@ fn main() {
         };
         sample_aldr_flat(&dist, &mut rng, &mut flip_state); // kill 'unused' warning
 
-        let preprocess_count = 1000;
         let start_build_time_warm = Instant::now();
         for _ in 0..(preprocess_count-1) {
             mem::drop(dist);
@@ -213,35 +232,36 @@ fn main() {
         mem::drop(dist);
         dist = preprocess_aldr_flat(weights_clone);
         let build_duration_warm = start_build_time_warm.elapsed();
-    
-        // Measure the time it takes to collect 10^8 samples
-        let sample_count = 100_000_000;
-        let mut sample_accumulator = 0;
-    
+
+        // Draw the untimed warmup samples, then time sample_count samples
+        let mut sample_accumulator: u64 = 0;
+        for _ in 0..warmup_count {
+            sample_accumulator += sample_aldr_flat(&dist, &mut rng, &mut flip_state) as u64;
+        }
         // reset flip state
         flip_state.num_rng_calls = 0;
         flip_state.flip_word = 0;
         flip_state.flip_pos = 0;
-    
         let start_sample_time = Instant::now();
         for _ in 0..sample_count {
-            sample_accumulator += sample_aldr_flat(&dist, &mut rng, &mut flip_state);
+            sample_accumulator += sample_aldr_flat(&dist, &mut rng, &mut flip_state) as u64;
         }
         let sample_duration = start_sample_time.elapsed();
         let entropy_consumed = flip_state.num_rng_calls * FLIP_K - flip_state.flip_pos;
+        dump(dump_count, || sample_aldr_flat(&dist, &mut rng, &mut flip_state) as u64);
         // size of u32 times the length of the leaves_flat array and the breadths array
         let sampler_bytes = 4 * (dist.leaves_flat.len() + dist.breadths.len());
-    
-        println!("{}c {} {} {} {} {}",
+        Ok(Bench {
             sample_accumulator,
-            build_duration_cold.as_secs_f64(),
-            build_duration_warm.as_secs_f64() / preprocess_count as f64,
-            sample_duration.as_secs_f64() / sample_count as f64,
-            entropy_consumed as f64 / sample_count as f64,
-            sampler_bytes);
-    } else {
+            build_duration_cold: build_duration_cold.as_secs_f64(),
+            build_duration_warm: build_duration_warm.as_secs_f64() / preprocess_count as f64,
+            sample_duration: sample_duration.as_secs_f64() / sample_count as f64,
+            entropy_consumed: entropy_consumed as f64 / sample_count as f64,
+            sampler_bytes,
+        })
+    } else if sampler == "alias.rust.osrng" || sampler == "alias.rust" {
         let rng : Box<dyn RngCore> =
-            if args[1] == "alias.rust.osrng" {
+            if sampler == "alias.rust.osrng" {
                 Box::new(WrappedOsRng::new())
             } else {
                 Box::new(rng())
@@ -255,7 +275,6 @@ fn main() {
         let build_duration_cold = start_build_time_cold.elapsed();
         dist.sample(&mut counting_rng); // kill 'unused' warning
 
-        let preprocess_count = 1000;
         let start_build_time_warm = Instant::now();
         for _ in 0..(preprocess_count-1) {
             mem::drop(dist);
@@ -267,25 +286,151 @@ fn main() {
         dist = WeightedAliasIndex::new(weights_clone).unwrap();
         let build_duration_warm = start_build_time_warm.elapsed();
 
-        // Measure the time it takes to collect 10^8 samples
-        let sample_count = 100_000_000;
-        let mut sample_accumulator = 0;
-
+        // Draw the untimed warmup samples, then time sample_count samples
+        let mut sample_accumulator: u64 = 0;
+        for _ in 0..warmup_count {
+            sample_accumulator += dist.sample(&mut counting_rng) as u64;
+        }
         counting_rng.counter = 0;
         let start_sample_time = Instant::now();
         for _ in 0..sample_count {
-            sample_accumulator += dist.sample(&mut counting_rng);
+            sample_accumulator += dist.sample(&mut counting_rng) as u64;
         }
         let sample_duration = start_sample_time.elapsed();
         let entropy_consumed = counting_rng.count();
+        dump(dump_count, || dist.sample(&mut counting_rng) as u64);
         let sampler_bytes = (2*n + 2) * std::mem::size_of::<u32>();
-
-        println!("{}c {} {} {} {} {}",
+        Ok(Bench {
             sample_accumulator,
-            build_duration_cold.as_secs_f64(),
-            build_duration_warm.as_secs_f64() / preprocess_count as f64,
-            sample_duration.as_secs_f64() / sample_count as f64,
-            entropy_consumed as f64 / sample_count as f64,
-            sampler_bytes);
+            build_duration_cold: build_duration_cold.as_secs_f64(),
+            build_duration_warm: build_duration_warm.as_secs_f64() / preprocess_count as f64,
+            sample_duration: sample_duration.as_secs_f64() / sample_count as f64,
+            entropy_consumed: entropy_consumed as f64 / sample_count as f64,
+            sampler_bytes,
+        })
+    } else {
+        Err(format!("unknown sampler {}", sampler))
+    }
+}
+
+// the paths given, with each directory replaced by the .dist files in it (in name order)
+fn corpus_files(paths: &[String]) -> Vec<String> {
+    let mut files = Vec::new();
+    for path in paths {
+        match fs::read_dir(path) {
+            Ok(entries) => {
+                let mut dir_files: Vec<String> = entries
+                    .filter_map(|entry| entry.ok())
+                    .map(|entry| entry.path().to_string_lossy().into_owned())
+                    .filter(|file| file.ends_with(".dist"))
+                    .collect();
+                dir_files.sort();
+                files.extend(dir_files);
+            }
+            Err(_) => files.push(path.clone()),
+        }
+    }
+    files
+}
+
+fn usage(name: &str) -> ! {
+    eprintln!("Usage: {} [options] <sampler> <file-path>", name);
+    eprintln!("       {} [options] --corpus <sampler>[,<sampler>...] <file-path|directory>...", name);
+    eprintln!("options: --samples N (default 1e8), --preprocess N (default 1000),");
+    eprintln!("         --warmup N (untimed samples before timing, default 0)");
+    eprintln!("       {} --dump N <sampler> <file-path>", name);
+    eprintln!("         (print N samples, one per line, instead of the measurements)");
+    std::process::exit(1);
+}
+
+fn main() {
+    let args: Vec<String> = env::args().collect();
+    let mut sample_count: u64 = 100_000_000;
+    let mut preprocess_count: u64 = 1000;
+    let mut warmup_count: u64 = 0;
+    let mut dump_count: u64 = 0;
+    let mut corpus = false;
+    let mut i = 1;
+    while i < args.len() && args[i].starts_with("--") {
+        if args[i] == "--corpus" {
+            corpus = true;
+        } else if i + 1 < args.len() && ["--samples", "--preprocess", "--warmup", "--dump"].contains(&args[i].as_str()) {
+            let value = args[i+1].parse::<f64>().unwrap_or_else(|_| usage(&args[0])) as u64;
+            match args[i].as_str() {
+                "--samples" => sample_count = value,
+                "--preprocess" => preprocess_count = value.max(1),
+                "--dump" => dump_count = value,
+                _ => warmup_count = value,
+            }
+            i += 1;
+        } else {
+            usage(&args[0]);
+        }
+        i += 1;
+    }
+
+    if dump_count > 0 {
+        // only preprocess once and print the samples
+        if corpus || args.len() != i + 2 {
+            usage(&args[0]);
+        }
+        if let Err(e) = read_weights(&args[i + 1])
+                .and_then(|weights| bench(&args[i], weights, 0, 1, 0, dump_count)) {
+            eprintln!("{}", e);
+            std::process::exit(1);
+        }
+        return;
+    }
+
+    if corpus {
+        // one line "path sampler preprocess_time_cold preprocess_time_warm
+        // sample_time flips num_bytes" per run (as in
+        // python/aldr-alias-performance-data.txt); runs with errors are skipped
+        if args.len() < i + 2 {
+            usage(&args[0]);
+        }
+        let files = corpus_files(&args[i+1..]);
+        let mut checksum: u64 = 0;
+        for sampler in args[i].split(',') {
+            for path in &files {
+                match read_weights(path).and_then(|weights|
+                        bench(sampler, weights, sample_count, preprocess_count, warmup_count, 0)) {
+                    Ok(b) => {
+                        checksum = checksum.wrapping_add(b.sample_accumulator);
+                        println!("{} {} {} {} {} {} {}",
+                            path,
+                            sampler,
+                            b.build_duration_cold,
+                            b.build_duration_warm,
+                            b.sample_duration,
+                            b.entropy_consumed,
+                            b.sampler_bytes);
+                    }
+                    Err(e) => eprintln!("{}", e),
+                }
+            }
+        }
+        eprintln!("{}c", checksum);
+        return;
+    }
+
+    // Get the file path from the command line arguments
+    if args.len() != i + 2 {
+        usage(&args[0]);
+    }
+    let result = read_weights(&args[i + 1])
+        .and_then(|weights| bench(&args[i], weights, sample_count, preprocess_count, warmup_count, 0));
+    match result {
+        Ok(b) => println!("{}c {} {} {} {} {}",
+            b.sample_accumulator,
+            b.build_duration_cold,
+            b.build_duration_warm,
+            b.sample_duration,
+            b.entropy_consumed,
+            b.sampler_bytes),
+        Err(e) => {
+            eprintln!("{}", e);
+            std::process::exit(1);
+        }
     }
 }